@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""Shared helpers for arm-embedded hooks (not a hook itself — no claude-hook metadata).
+
+Deployed next to the hook scripts, so `from embedded_hook_common import ...` resolves
+via the hook script's own directory on sys.path.
+
+Packaged by: arm-embedded
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.expanduser("~"), ".xmake", "rules", "embedded", "scripts")
+
+
+def import_lib_checksum():
+    """Import lib_checksum from package scripts directory."""
+    if SCRIPTS_DIR not in sys.path and os.path.isdir(SCRIPTS_DIR):
+        sys.path.insert(0, SCRIPTS_DIR)
+    import lib_checksum
+    return lib_checksum
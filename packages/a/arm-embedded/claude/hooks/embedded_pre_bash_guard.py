@@ -17,25 +17,44 @@ Packaged by: arm-embedded
 from __future__ import annotations
 
 import json
+import os
 import re
+import signal
 import subprocess
 import sys
 from pathlib import Path
 
 
+# ── Prefilter ──
+
+# One alternation scan over the command; only groups that fire run their detailed
+# checks. Most commands match nothing and pass through in a single scan.
+_PREFILTER = re.compile(
+    r"(?P<rm>\brm\s)"
+    r"|(?P<checkout>\bgit\s+checkout\b)"
+    r"|(?P<switch>\bgit\s+switch\b)"
+    r"|(?P<probe>pyocd\s+(?:flash|commander|rtt|gdbserver|reset|erase))"
+)
+
+
 # ── Safety Guards ──
 
+_RM_SAFE_RES = (
+    re.compile(r"\brm\s[^;|&]*(/tmp/|/var/|build/|\$TMPDIR)"),
+    re.compile(r"\brm\s+-f\s+\$TMPDIR"),
+)
+_CHECKOUT_FILE_RE = re.compile(r"\bgit\s+checkout\s+--\s")
+_CHECKOUT_NEWBRANCH_RE = re.compile(r"\bgit\s+checkout\s+-b\b")
+_SWITCH_CREATE_RE = re.compile(r"\bgit\s+switch\s+(-c|--create)\b")
+
 
 def _check_rm(command: str) -> str | None:
-    """Block rm commands on project files. Allow rm on /tmp/ and build/."""
-    if not re.search(r"\brm\s", command):
-        return None
-    safe_patterns = [
-        r"\brm\s[^;|&]*(/tmp/|/var/|build/|\$TMPDIR)",
-        r"\brm\s+-f\s+\$TMPDIR",
-    ]
-    for pattern in safe_patterns:
-        if re.search(pattern, command):
+    """Block rm commands on project files. Allow rm on /tmp/ and build/.
+
+    Called only after the prefilter matched `rm`.
+    """
+    for pattern in _RM_SAFE_RES:
+        if pattern.search(command):
             return None
     return (
         "rm はプロジェクトファイルに対して使用禁止です。"
@@ -44,19 +63,18 @@ def _check_rm(command: str) -> str | None:
     )
 
 
-def _check_git_checkout(command: str) -> str | None:
-    """Warn about git checkout/switch without stash."""
-    is_checkout = re.search(r"\bgit\s+checkout\b", command)
-    is_switch = re.search(r"\bgit\s+switch\b", command)
-    if not is_checkout and not is_switch:
-        return None
+def _check_git_checkout(command: str, is_checkout: bool, is_switch: bool) -> str | None:
+    """Warn about git checkout/switch without stash.
+
+    Called only after the prefilter matched `git checkout` and/or `git switch`.
+    """
     if is_checkout:
-        if re.search(r"\bgit\s+checkout\s+--\s", command):
+        if _CHECKOUT_FILE_RE.search(command):
             return None
-        if re.search(r"\bgit\s+checkout\s+-b\b", command):
+        if _CHECKOUT_NEWBRANCH_RE.search(command):
             return None
     if is_switch:
-        if re.search(r"\bgit\s+switch\s+(-c|--create)\b", command):
+        if _SWITCH_CREATE_RE.search(command):
             return None
     return (
         "git checkout/switch でブランチ切替する前に `git stash` を実行してください "
@@ -67,27 +85,41 @@ def _check_git_checkout(command: str) -> str | None:
 
 # ── pyOCD Probe Cleanup ──
 
-PROBE_COMMANDS = re.compile(
-    r"pyocd\s+(flash|commander|rtt|gdbserver|reset|erase)"
-)
 
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    """SIGTERM the process group, escalating to SIGKILL after 2s."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            proc.wait(timeout=2)
+            return
+        except subprocess.TimeoutExpired:
+            continue
 
-def _cleanup_pyocd_if_needed(command: str) -> None:
-    """Auto-cleanup orphaned pyOCD processes before probe commands."""
-    if not PROBE_COMMANDS.search(command):
-        return
 
+def _cleanup_pyocd_if_needed() -> None:
+    """Auto-cleanup orphaned pyOCD processes before probe commands."""
     # Find pyocd_tool.py in package scripts directory
     tool = Path.home() / ".xmake" / "rules" / "embedded" / "scripts" / "pyocd_tool.py"
     if not tool.exists():
         return
     try:
-        result = subprocess.run(
+        # Own process group so a timeout also takes down any grandchildren
+        proc = subprocess.Popen(
             [sys.executable, str(tool), "cleanup"],
-            capture_output=True, text=True, timeout=10,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            start_new_session=True,
         )
-        if result.returncode == 0:
-            info = json.loads(result.stdout)
+        try:
+            stdout, _ = proc.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(proc)
+            return
+        if proc.returncode == 0:
+            info = json.loads(stdout)
             if info.get("killed", 0) > 0:
                 print(
                     f"pyOCD: {info['killed']} orphaned process(es) cleaned up",
@@ -97,6 +129,12 @@ def _cleanup_pyocd_if_needed(command: str) -> None:
         pass
 
 
+def _block(reason: str | None) -> None:
+    if reason is not None:
+        print(reason, file=sys.stderr)
+        sys.exit(2)
+
+
 def main() -> None:
     try:
         data = json.load(sys.stdin)
@@ -107,16 +145,19 @@ def main() -> None:
     if not command:
         return
 
+    hits = {m.lastgroup for m in _PREFILTER.finditer(command)}
+    if not hits:
+        return
+
     # Safety guards (block on failure)
-    checks = [_check_rm, _check_git_checkout]
-    for check in checks:
-        reason = check(command)
-        if reason is not None:
-            print(reason, file=sys.stderr)
-            sys.exit(2)
+    if "rm" in hits:
+        _block(_check_rm(command))
+    if "checkout" in hits or "switch" in hits:
+        _block(_check_git_checkout(command, "checkout" in hits, "switch" in hits))
 
     # pyOCD cleanup (non-blocking)
-    _cleanup_pyocd_if_needed(command)
+    if "probe" in hits:
+        _cleanup_pyocd_if_needed()
 
 
 if __name__ == "__main__":
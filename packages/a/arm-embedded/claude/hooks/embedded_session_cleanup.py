@@ -19,43 +19,76 @@ import subprocess
 import sys
 from pathlib import Path
 
+from embedded_hook_common import import_lib_checksum
+
+
+_PROC_NAMES = ("pyocd", "openocd", "arm-none-eabi-gdb")
+# Don't kill MCP server or tool processes (matched against lowercased cmdline)
+_PROC_EXCLUDES = ("_server.py", "mcp", "pyocd_tool")
+
+
+def _iter_processes():
+    """Yield (pid, cmdline) for running processes in a single pass.
+
+    Linux: scan /proc directly. Elsewhere: psutil if available,
+    otherwise one `pgrep -fl` call covering all target names.
+    """
+    if os.path.isdir("/proc/self"):
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/cmdline", "rb") as f:
+                    raw = f.read()
+            except OSError:
+                continue
+            if raw:
+                yield int(entry.name), raw.rstrip(b"\0").replace(b"\0", b" ").decode(errors="replace")
+        return
+
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        for proc in psutil.process_iter(["pid", "cmdline"]):
+            cmdline = proc.info.get("cmdline")
+            if cmdline:
+                yield proc.info["pid"], " ".join(cmdline)
+        return
+
+    r = subprocess.run(
+        ["pgrep", "-fl", "|".join(_PROC_NAMES)],
+        capture_output=True, text=True, timeout=5,
+    )
+    for line in r.stdout.splitlines():
+        pid, _, cmdline = line.strip().partition(" ")
+        if pid.isdigit():
+            yield int(pid), cmdline
+
 
 def _cleanup_pyocd() -> None:
     """Kill orphaned pyocd/openocd/gdb processes."""
-    for proc_name in ("pyocd", "openocd", "arm-none-eabi-gdb"):
-        try:
-            r = subprocess.run(
-                ["pgrep", "-fl", proc_name],
-                capture_output=True, text=True, timeout=5,
-            )
-            for line in r.stdout.strip().splitlines():
-                if not line:
-                    continue
-                # Don't kill MCP server or tool processes
-                if "_server.py" in line or "mcp" in line.lower() or "pyocd_tool" in line:
-                    continue
-                pid = int(line.split()[0])
-                if pid == os.getpid():
-                    continue
-                try:
-                    os.kill(pid, signal.SIGTERM)
-                except (ProcessLookupError, PermissionError):
-                    pass
-        except Exception:
-            pass
+    my_pid = os.getpid()
+    try:
+        for pid, cmdline in _iter_processes():
+            if pid == my_pid or not any(n in cmdline for n in _PROC_NAMES):
+                continue
+            cmd_lower = cmdline.lower()
+            if any(e in cmd_lower for e in _PROC_EXCLUDES):
+                continue
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+    except Exception:
+        pass
 
 
 def _save_lib_snapshot(session_id: str) -> None:
     """Save lib/ file checksums as session baseline for change detection."""
-    # Import lib_checksum from package scripts directory
-    scripts_dir = os.path.join(
-        os.path.expanduser("~"), ".xmake", "rules", "embedded", "scripts"
-    )
-    if os.path.isdir(scripts_dir):
-        sys.path.insert(0, scripts_dir)
-
     try:
-        import lib_checksum
+        lib_checksum = import_lib_checksum()
         if session_id:
             lib_checksum.set_session_id(session_id)
         lib_checksum.save_snapshot()
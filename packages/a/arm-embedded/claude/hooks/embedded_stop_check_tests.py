@@ -16,19 +16,9 @@ Packaged by: arm-embedded
 from __future__ import annotations
 
 import json
-import os
 import sys
 
-
-def _import_lib_checksum():
-    """Import lib_checksum from package scripts directory."""
-    scripts_dir = os.path.join(
-        os.path.expanduser("~"), ".xmake", "rules", "embedded", "scripts"
-    )
-    if os.path.isdir(scripts_dir):
-        sys.path.insert(0, scripts_dir)
-    import lib_checksum
-    return lib_checksum
+from embedded_hook_common import import_lib_checksum
 
 
 def main() -> None:
@@ -38,7 +28,7 @@ def main() -> None:
         data = {}
 
     try:
-        lib_checksum = _import_lib_checksum()
+        lib_checksum = import_lib_checksum()
     except ImportError:
         return
 
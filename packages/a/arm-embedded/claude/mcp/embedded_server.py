@@ -14,20 +14,40 @@ CLI パースに依存しない安定した自動化を提供する。
 
 依存:
   pip install "mcp[cli]"
+
+環境変数:
+  EMBEDDED_MCP_TRACEBACK  設定するとエラー応答にトレースバックを含める
 """
 
 from __future__ import annotations
 
+import argparse
+import atexit
+import importlib.util
 import json
+import os
 import re
+import signal
 import struct
 import subprocess
 import sys
+import threading
 import time
+import traceback
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any
 
 from mcp.server.fastmcp import FastMCP
 
+# NumPy はオプション（DMA オーディオ解析のベクトル化に使用）
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # pyocd_tool をインポートできるようにパスを追加
 # パッケージ同梱 scripts/ (arm-embedded/scripts/ → ~/.xmake/rules/embedded/scripts/)
 _pkg_scripts = Path(__file__).resolve().parent.parent.parent / "scripts"
@@ -35,7 +55,25 @@ _pkg_scripts = Path(__file__).resolve().parent.parent.parent / "scripts"
 if (_pkg_scripts / "pyocd_tool.py").exists():
     sys.path.insert(0, str(_pkg_scripts))
 
-import pyocd_tool  # noqa: E402
+# pyocd_tool は pyOCD 本体を読み込むため重い。ビルド/テスト系ツールだけの
+# セッションで起動コストを払わないよう、初回のプローブ操作まで遅延する。
+_pyocd_tool = None
+
+
+def _pt():
+    """pyocd_tool モジュールを遅延インポートして返す。"""
+    global _pyocd_tool
+    if _pyocd_tool is None:
+        import pyocd_tool as _m
+        _pyocd_tool = _m
+    return _pyocd_tool
+
+
+# pyocd が無い Python で起動された場合、pyocd_tool は import 時に
+# 正しい Python で再実行 (execv) する。セッション途中での再実行を避けるため、
+# その場合だけは起動時に読み込んでおく。
+if importlib.util.find_spec("pyocd") is None:
+    _pt()
 
 app = FastMCP("embedded")
 
@@ -44,6 +82,32 @@ app = FastMCP("embedded")
 # ---------------------------------------------------------------------------
 
 
+def _dumps(obj: Any) -> str:
+    """ツール応答用のコンパクト JSON（MCP クライアントが機械的に読むため整形しない）。"""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+# 設定時のみエラー応答にトレースバックを含める（通常のエラーはプローブ未接続や
+# タイムアウトで、フレーム整形のコストと応答サイズに見合わない）
+_INCLUDE_TRACEBACK = bool(os.environ.get("EMBEDDED_MCP_TRACEBACK"))
+
+
+def _error_json(e: BaseException, **extra: Any) -> str:
+    """ツール共通のエラー応答 JSON を返す（except 節内で呼ぶ）。"""
+    payload: dict[str, Any] = {**extra, "error": str(e)}
+    if _INCLUDE_TRACEBACK:
+        payload["traceback"] = traceback.format_exc()
+    return _dumps(payload)
+
+
+def _parse_csv(text: str) -> list[str]:
+    """カンマ区切り文字列を空要素を除いたリストにする（トークン毎に strip 1 回）。"""
+    if "," not in text:
+        token = text.strip()
+        return [token] if token else []
+    return [t for t in (x.strip() for x in text.split(",")) if t]
+
+
 def _run(args: list[str], timeout: int = 30) -> dict:
     """タイムアウト付き subprocess 実行。"""
     try:
@@ -59,17 +123,40 @@ def _run(args: list[str], timeout: int = 30) -> dict:
         return {"success": False, "stdout": "", "stderr": str(e)}
 
 
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+_MODE_RE = re.compile(r"^\s*mode\s*[:=]\s*(\w+)", re.M)
+
+
+# 連続した build_target / build_size 呼び出しで xmake show を共有するためのキャッシュ
+# cwd → (取得時刻, mode)
+_MODE_CACHE_TTL_S = 5.0
+_mode_cache: dict[str, tuple[float, str | None]] = {}
+
+
 def _get_current_mode() -> str | None:
     """xmake の現在のビルドモードを取得する（xmake show の出力をパース）。"""
+    key = os.getcwd()
+    cached = _mode_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < _MODE_CACHE_TTL_S:
+        return cached[1]
+
     r = _run(["xmake", "show"], timeout=10)
-    output = r["stdout"] + "\n" + r["stderr"]
-    for line in output.splitlines():
-        # ANSI エスケープ除去してから検索
-        clean = re.sub(r"\x1b\[[0-9;]*m", "", line)
-        m = re.match(r"\s*mode\s*[:=]\s*(\w+)", clean)
-        if m:
-            return m.group(1)
-    return None
+    # ANSI エスケープを出力全体から一度だけ除去してから検索
+    clean = _ANSI_RE.sub("", r["stdout"] + "\n" + r["stderr"])
+    m = _MODE_RE.search(clean)
+    mode = m.group(1) if m else None
+    _mode_cache[key] = (time.monotonic(), mode)
+    return mode
+
+
+def _set_mode(mode: str) -> dict:
+    """xmake f -m <mode> を実行し、成功時はモードキャッシュを更新する。"""
+    cfg = _run(["xmake", "f", "-m", mode, "-y"], timeout=30)
+    if cfg["success"]:
+        _mode_cache[os.getcwd()] = (time.monotonic(), mode)
+    else:
+        _mode_cache.pop(os.getcwd(), None)
+    return cfg
 
 
 # ===================================================================
@@ -77,6 +164,56 @@ def _get_current_mode() -> str | None:
 # ===================================================================
 
 
+_TESTS_PASSED_RE = re.compile(r"(\d+)/(\d+)\s+tests?\s+passed")
+_TEST_OUTPUT_TAIL_LINES = 200
+
+
+def _run_tests_streaming(args: list[str], timeout: int) -> tuple[dict, re.Match | None]:
+    """xmake test を行単位でストリーム実行する。
+
+    出力全体は保持せず末尾 _TEST_OUTPUT_TAIL_LINES 行のみ返す（stderr は stdout に統合）。
+    合否行 "N/M tests passed" は最後に一致したものだけを保持する。
+    """
+    try:
+        proc = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, errors="replace", start_new_session=True,
+        )
+    except FileNotFoundError as e:
+        return {"success": False, "stdout": "", "stderr": str(e)}, None
+
+    timed_out = threading.Event()
+
+    def _kill() -> None:
+        # テストバイナリ等の子孫プロセスがパイプを保持し続けないようグループごと終了
+        timed_out.set()
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    timer = threading.Timer(timeout, _kill)
+    timer.start()
+    tail: deque[str] = deque(maxlen=_TEST_OUTPUT_TAIL_LINES)
+    last: re.Match | None = None
+    try:
+        with proc:
+            for line in proc.stdout:
+                tail.append(line)
+                m = _TESTS_PASSED_RE.search(line)
+                if m:
+                    last = m
+    finally:
+        timer.cancel()
+
+    result = {
+        "success": proc.returncode == 0 and not timed_out.is_set(),
+        "stdout": "".join(tail).strip(),
+        "stderr": f"Timed out ({timeout}s)" if timed_out.is_set() else "",
+    }
+    return result, last
+
+
 @app.tool()
 def run_tests(filter: str = "") -> str:
     """xmake テストを実行する。
@@ -87,15 +224,14 @@ def run_tests(filter: str = "") -> str:
     args = ["xmake", "test"]
     if filter:
         args.append(filter)
-    result = _run(args, timeout=120)
+    result, m = _run_tests_streaming(args, timeout=120)
 
-    m = re.findall(r"(\d+)/(\d+)\s+tests?\s+passed", result["stdout"])
     if m:
-        passed, total = int(m[-1][0]), int(m[-1][1])
+        passed, total = int(m.group(1)), int(m.group(2))
         result["passed"] = passed
         result["total"] = total
         result["all_passed"] = passed == total
-    return json.dumps(result, indent=2)
+    return _dumps(result)
 
 
 @app.tool()
@@ -109,25 +245,30 @@ def build_target(target: str, mode: str = "release") -> str:
         mode: ビルドモード（"debug" or "release"）
     """
     original_mode = _get_current_mode()
+    # 再設定したときだけ復元する（ビルド後に xmake show で問い合わせ直さない）
+    need_restore = original_mode is not None and original_mode != mode
 
     def _restore_mode() -> None:
-        """ビルド前のモードに復元する。"""
-        if original_mode:
-            _run(["xmake", "f", "-m", original_mode, "-y"], timeout=30)
+        """ビルド前のモードに復元する（モードを変えていなければ何もしない）。"""
+        if need_restore:
+            _set_mode(original_mode)
 
-    cfg = _run(["xmake", "f", "-m", mode, "-y"], timeout=30)
-    if not cfg["success"]:
-        return json.dumps({"error": "Config failed", "detail": cfg}, indent=2)
+    # 既に要求モードなら再設定不要
+    if original_mode != mode:
+        cfg = _set_mode(mode)
+        if not cfg["success"]:
+            return _dumps({"error": "Config failed", "detail": cfg})
 
     build = _run(["xmake", "build", target], timeout=120)
     if build["success"]:
         build["mode"] = mode
         _restore_mode()
-        return json.dumps(build, indent=2)
+        return _dumps(build)
 
     # release 失敗時は debug にフォールバック
     if mode == "release":
-        cfg2 = _run(["xmake", "f", "-m", "debug", "-y"], timeout=30)
+        cfg2 = _set_mode("debug")
+        need_restore = original_mode is not None and original_mode != "debug"
         if cfg2["success"]:
             build2 = _run(["xmake", "build", target], timeout=120)
             build2["mode"] = "debug"
@@ -135,11 +276,11 @@ def build_target(target: str, mode: str = "release") -> str:
             if not build2["success"]:
                 build2["release_error"] = build.get("stdout", "")
             _restore_mode()
-            return json.dumps(build2, indent=2)
+            return _dumps(build2)
 
     build["mode"] = mode
     _restore_mode()
-    return json.dumps(build, indent=2)
+    return _dumps(build)
 
 
 # ===================================================================
@@ -147,6 +288,13 @@ def build_target(target: str, mode: str = "release") -> str:
 # ===================================================================
 
 
+# ターゲット一覧キャッシュ: (cwd, xmake.lua の mtime_ns) → (取得時刻, targets)
+# includes() 先の xmake.lua 変更はキーに現れないため TTL で鮮度を保証する
+_TARGETS_CACHE_TTL_S = 60.0
+_targets_cache: dict[tuple[str, int], tuple[float, list[str]]] = {}
+_TARGET_SPLIT_RE = re.compile(r"[\s,]+")
+
+
 @app.tool()
 def list_targets(filter: str = "") -> str:
     """xmake ターゲットを一覧表示する。
@@ -155,15 +303,26 @@ def list_targets(filter: str = "") -> str:
     Args:
         filter: 名前フィルタ（例: "test_", "bench", "wasm", "renode"）。空なら全ターゲット。
     """
-    r = _run(["xmake", "show", "-l", "targets"], timeout=10)
-    if not r["success"]:
-        return json.dumps({"error": "Failed to list targets", "detail": r}, indent=2)
-    # ANSI 除去してターゲット名を抽出
-    clean = re.sub(r"\x1b\[[0-9;]*m", "", r["stdout"])
-    targets = sorted(set(t.strip() for t in re.split(r"[\s,]+", clean) if t.strip()))
+    cwd = os.getcwd()
+    try:
+        key = (cwd, os.stat(os.path.join(cwd, "xmake.lua")).st_mtime_ns)
+    except OSError:
+        key = None
+    cached = _targets_cache.get(key) if key else None
+    if cached is not None and time.monotonic() - cached[0] < _TARGETS_CACHE_TTL_S:
+        targets = cached[1]
+    else:
+        r = _run(["xmake", "show", "-l", "targets"], timeout=10)
+        if not r["success"]:
+            return _dumps({"error": "Failed to list targets", "detail": r})
+        # ANSI 除去してターゲット名を抽出
+        clean = _ANSI_RE.sub("", r["stdout"])
+        targets = sorted(set(t for t in _TARGET_SPLIT_RE.split(clean) if t))
+        if key:
+            _targets_cache[key] = (time.monotonic(), targets)
     if filter:
         targets = [t for t in targets if filter.lower() in t.lower()]
-    return json.dumps({"targets": targets, "count": len(targets)}, indent=2)
+    return _dumps({"targets": targets, "count": len(targets)})
 
 
 @app.tool()
@@ -176,9 +335,9 @@ def run_target(target: str, timeout_s: int = 60) -> str:
     """
     build = _run(["xmake", "build", target], timeout=120)
     if not build["success"]:
-        return json.dumps({"error": "Build failed", "detail": build}, indent=2)
+        return _dumps({"error": "Build failed", "detail": build})
     run = _run(["xmake", "run", target], timeout=timeout_s)
-    return json.dumps({"build": build, "run": run}, indent=2)
+    return _dumps({"build": build, "run": run})
 
 
 @app.tool()
@@ -191,28 +350,37 @@ def run_benchmark(target: str) -> str:
     return run_target(target, timeout_s=60)
 
 
+_SIZE_RE = re.compile(
+    r"Flash:\s+(?P<fu>\d+)\s*/\s*(?P<ft>\d+)\s*bytes\s*\((?P<fp>[0-9.]+)%\)"
+    r"|RAM:\s+(?P<ru>\d+)\s*/\s*(?P<rt>\d+)\s*bytes\s*\((?P<rp>[0-9.]+)%\)"
+    r"(?:\s*\[data:\s*(?P<rd>\d+),\s*bss:\s*(?P<rb>\d+)\])?"
+)
+
+
 def _parse_build_size(stdout: str) -> dict | None:
-    """ビルド出力から Memory Usage Summary をパースする。"""
-    flash_m = re.search(r"Flash:\s+(\d+)\s*/\s*(\d+)\s*bytes\s*\(([0-9.]+)%\)", stdout)
-    ram_m = re.search(
-        r"RAM:\s+(\d+)\s*/\s*(\d+)\s*bytes\s*\(([0-9.]+)%\)"
-        r"(?:\s*\[data:\s*(\d+),\s*bss:\s*(\d+)\])?",
-        stdout,
-    )
+    """ビルド出力から Memory Usage Summary をパースする（Flash/RAM を 1 パスで走査）。"""
+    flash_m = ram_m = None
+    for m in _SIZE_RE.finditer(stdout):
+        if m.group("fu") is not None:
+            flash_m = flash_m or m
+        else:
+            ram_m = ram_m or m
+        if flash_m and ram_m:
+            break
     if not flash_m:
         return None
     result: dict = {
-        "flash_used": int(flash_m.group(1)),
-        "flash_total": int(flash_m.group(2)),
-        "flash_percent": float(flash_m.group(3)),
+        "flash_used": int(flash_m.group("fu")),
+        "flash_total": int(flash_m.group("ft")),
+        "flash_percent": float(flash_m.group("fp")),
     }
     if ram_m:
-        result["ram_used"] = int(ram_m.group(1))
-        result["ram_total"] = int(ram_m.group(2))
-        result["ram_percent"] = float(ram_m.group(3))
-        if ram_m.group(4):
-            result["ram_data"] = int(ram_m.group(4))
-            result["ram_bss"] = int(ram_m.group(5))
+        result["ram_used"] = int(ram_m.group("ru"))
+        result["ram_total"] = int(ram_m.group("rt"))
+        result["ram_percent"] = float(ram_m.group("rp"))
+        if ram_m.group("rd"):
+            result["ram_data"] = int(ram_m.group("rd"))
+            result["ram_bss"] = int(ram_m.group("rb"))
     return result
 
 
@@ -231,29 +399,116 @@ def build_size(target: str, mode: str = "release") -> str:
     size = _parse_build_size(result.get("stdout", ""))
     if size:
         result["size"] = size
-    return json.dumps(result, indent=2)
+    return _dumps(result)
 
 
 # ===================================================================
 # pyOCD — デバッグプローブ（pyocd_tool.py API 直接使用）
 # ===================================================================
 
+# 連続した MCP 呼び出し（read_symbol → read_registers 等）で SWD 再初期化を避けるため、
+# (uid, mcu) ごとにセッションを短時間保持する。使用中のセッションはキャッシュから
+# 取り出されているため、アイドル回収タイマーが使用中のセッションを閉じることはない。
+# アイドル時間経過後は閉じてプローブを解放する（外部の pyocd コマンドと競合しないように）。
+_SESSION_IDLE_TTL_S = 2.0
+_session_lock = threading.Lock()
+_session_cache: dict[tuple[str, str], tuple[Any, float]] = {}
+# 要求 mcu（"" は自動検出）→ 直近に解決した (uid, mcu)。キャッシュ済みセッションがあれば
+# resolve_probe（USB 列挙）を省く
+_resolved_probes: dict[str, tuple[str, str]] = {}
+_session_reaper: threading.Timer | None = None
+
+
+def _close_quietly(session: Any) -> None:
+    try:
+        session.close()
+    except Exception:
+        pass
+
+
+def _schedule_reaper_locked() -> None:
+    """アイドルセッション回収タイマーを起動する（_session_lock 保持中に呼ぶ）。"""
+    global _session_reaper  # noqa: PLW0603
+    if _session_reaper is not None or not _session_cache:
+        return
+    _session_reaper = threading.Timer(_SESSION_IDLE_TTL_S, _reap_idle_sessions)
+    _session_reaper.daemon = True
+    _session_reaper.start()
+
+
+def _reap_idle_sessions() -> None:
+    global _session_reaper  # noqa: PLW0603
+    expired = []
+    with _session_lock:
+        _session_reaper = None
+        now = time.monotonic()
+        for key, (session, last_used) in list(_session_cache.items()):
+            if now - last_used >= _SESSION_IDLE_TTL_S:
+                del _session_cache[key]
+                expired.append(session)
+        _schedule_reaper_locked()
+    for session in expired:
+        _close_quietly(session)
+
+
+def _close_cached_sessions() -> None:
+    """保持中の全セッションを閉じる（プローブを占有する操作の前、終了時）。"""
+    with _session_lock:
+        sessions = [session for session, _ in _session_cache.values()]
+        _session_cache.clear()
+    for session in sessions:
+        _close_quietly(session)
+
+
+atexit.register(_close_cached_sessions)
+
+
+@contextmanager
+def _probe_session(mcu: str) -> Iterator[tuple[str, str, Any]]:
+    """キャッシュ済みセッションを取り出す（なければ開く）。
+
+    正常終了時はキャッシュに戻し、例外時はセッションを閉じて破棄する。
+    キャッシュ済みセッションがあればプローブの解決（USB 列挙）も省く。
+    Yields: (uid, mcu_resolved, session)
+    """
+    with _session_lock:
+        key = _resolved_probes.get(mcu)
+        entry = _session_cache.pop(key, None) if key is not None else None
+    if entry is None:
+        key = _pt().resolve_probe(mcu or None)
+        with _session_lock:
+            entry = _session_cache.pop(key, None)
+    uid, mcu_resolved = key
+    session = entry[0] if entry is not None else _pt().open_session(uid, mcu_resolved)
+    try:
+        yield uid, mcu_resolved, session
+    except BaseException:
+        _close_quietly(session)
+        # プローブの差し替え等に備え、次回は解決し直す
+        with _session_lock:
+            _resolved_probes.pop(mcu, None)
+        raise
+    with _session_lock:
+        _session_cache[key] = (session, time.monotonic())
+        _resolved_probes[mcu] = key
+        _schedule_reaper_locked()
+
 
 @app.tool()
 def probe_list() -> str:
     """接続されている全デバッグプローブを一覧表示する。
     複数プローブ接続時はそれぞれの UID、MCU、ボード名を返す。
     """
-    probes = pyocd_tool.list_probes()
-    return json.dumps({"probes": probes, "count": len(probes)}, indent=2)
+    probes = _pt().list_probes()
+    return _dumps({"probes": probes, "count": len(probes)})
 
 
 @app.tool()
 def cleanup_processes() -> str:
     """孤立したデバッグプロセス（pyocd, openocd, gdb）を終了する。"""
-    ns = type("NS", (), {"command": "cleanup"})()
-    result = pyocd_tool.cmd_cleanup(ns)
-    return json.dumps(result, indent=2)
+    _close_cached_sessions()
+    result = _pt().cmd_cleanup(argparse.Namespace(command="cleanup"))
+    return _dumps(result)
 
 
 @app.tool()
@@ -265,13 +520,14 @@ def flash(binary: str, mcu: str = "") -> str:
         binary: .bin/.elf ファイルのパス
         mcu: MCU ターゲット（例: "stm32f407vg", "stm32h750xx"）。空なら自動選択。
     """
-    ns = type("NS", (), {"binary": binary, "mcu": mcu or None})()
+    ns = argparse.Namespace(binary=binary, mcu=mcu or None)
     try:
-        result = pyocd_tool.cmd_flash(ns)
-        return json.dumps(result, indent=2)
+        # flash は halt モード + 専用オプションで接続するため保持セッションを解放
+        _close_cached_sessions()
+        result = _pt().cmd_flash(ns)
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -281,13 +537,14 @@ def reset(mcu: str = "") -> str:
     Args:
         mcu: MCU ターゲット。空なら自動選択。
     """
-    ns = type("NS", (), {"mcu": mcu or None})()
     try:
-        result = pyocd_tool.cmd_reset(ns)
-        return json.dumps(result, indent=2)
+        with _probe_session(mcu) as (uid, mcu_resolved, session):
+            session.target.reset()
+            state = session.target.get_state().name
+        result = {"uid": uid, "mcu": mcu_resolved, "state": state, "status": "ok"}
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -297,13 +554,18 @@ def target_status(mcu: str = "") -> str:
     Args:
         mcu: MCU ターゲット。空なら自動選択。
     """
-    ns = type("NS", (), {"mcu": mcu or None})()
     try:
-        result = pyocd_tool.cmd_status(ns)
-        return json.dumps(result, indent=2)
+        with _probe_session(mcu) as (uid, mcu_resolved, session):
+            target = session.target
+            result = {
+                "uid": uid,
+                "mcu": mcu_resolved,
+                "state": target.get_state().name,
+                "part_number": target.part_number,
+            }
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -315,13 +577,22 @@ def read_memory(address: str, size: int = 4, mcu: str = "") -> str:
         size: 読み取りバイト数
         mcu: MCU ターゲット。空なら自動選択。
     """
-    ns = type("NS", (), {"addr": address, "size": str(size), "mcu": mcu or None})()
     try:
-        result = pyocd_tool.cmd_read(ns)
-        return json.dumps(result, indent=2)
+        addr = int(address, 0)
+        with _probe_session(mcu) as (uid, mcu_resolved, session):
+            target = session.target
+            read = _pt()._read_blocks(target, target.cores[0], [("mem", addr, size)])["mem"]
+        result = {
+            "uid": uid,
+            "mcu": mcu_resolved,
+            "address": f"0x{addr:08X}",
+            "size": size,
+            "words": read["words"],
+            "hex": read["hex"],
+        }
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -330,21 +601,23 @@ def read_memory_after_run(
 ) -> str:
     """リセット→指定ms実行→halt→メモリ読み取り。
 
+    結果の "hex" は常に返す。ワード毎のリスト "words" は size が 256 bytes 以下の
+    ときのみ含まれる（大きなダンプでは "hex" をデコードする）。
+
     Args:
         address: 16進アドレス
-        size: 読み取りバイト数
+        size: 読み取りバイト数（256 超では "words" を省略）
         run_ms: 実行ミリ秒数
         mcu: MCU ターゲット。空なら自動選択。
     """
-    ns = type("NS", (), {
-        "addr": address, "size": str(size), "ms": str(run_ms), "mcu": mcu or None,
-    })()
+    ns = argparse.Namespace(addr=address, size=str(size), ms=str(run_ms), mcu=mcu or None)
     try:
-        result = pyocd_tool.cmd_run_read(ns)
-        return json.dumps(result, indent=2)
+        # run-read は halt モードで接続するため保持セッションを解放
+        _close_cached_sessions()
+        result = _pt().cmd_run_read(ns)
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -357,17 +630,25 @@ def read_symbol(elf: str, symbol: str, size: int = 0, mcu: str = "") -> str:
         size: 読み取りバイト数（0ならシンボルサイズから自動判定）
         mcu: MCU ターゲット。空なら自動選択。
     """
-    ns = type("NS", (), {
-        "elf": elf, "symbol": symbol,
-        "size": str(size) if size > 0 else None,
-        "mcu": mcu or None,
-    })()
     try:
-        result = pyocd_tool.cmd_read_symbol(ns)
-        return json.dumps(result, indent=2)
+        addr, sym_size = _pt()._resolve_symbol(elf, symbol)
+        if size <= 0:
+            size = sym_size if sym_size > 0 else 64
+        with _probe_session(mcu) as (uid, mcu_resolved, session):
+            target = session.target
+            read = _pt()._read_blocks(target, target.cores[0], [("sym", addr, size)])["sym"]
+        result = {
+            "uid": uid,
+            "mcu": mcu_resolved,
+            "symbol": symbol,
+            "address": f"0x{addr:08X}",
+            "size": size,
+            "words": read["words"],
+            "hex": read["hex"],
+        }
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -379,21 +660,36 @@ def read_symbols(elf: str, symbols: str, mcu: str = "") -> str:
         symbols: カンマ区切りシンボル名（例: "umi::dbg::usb,umi::dbg::audio"）
         mcu: MCU ターゲット。空なら自動選択。
     """
-    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    symbol_list = _parse_csv(symbols)
     if not symbol_list:
-        return json.dumps({"error": "symbols is empty"}, indent=2)
+        return _dumps({"error": "symbols is empty"})
 
-    ns = type("NS", (), {
-        "elf": elf,
-        "symbols": symbol_list,
-        "mcu": mcu or None,
-    })()
     try:
-        result = pyocd_tool.cmd_read_symbols(ns)
-        return json.dumps(result, indent=2)
+        resolved = _pt()._resolve_symbols(elf, symbol_list)
+        blocks: list[tuple[str, int, int]] = []
+        for sym in symbol_list:
+            addr, sym_size = resolved[sym]
+            blocks.append((sym, addr, sym_size if sym_size > 0 else 64))
+        with _probe_session(mcu) as (uid, mcu_resolved, session):
+            target = session.target
+            read_map = _pt()._read_blocks(target, target.cores[0], blocks)
+        result = {
+            "uid": uid,
+            "mcu": mcu_resolved,
+            "elf": elf,
+            "symbols": {
+                sym: {
+                    "address": f"0x{addr:08X}",
+                    "size": size,
+                    "words": read_map[sym]["words"],
+                    "hex": read_map[sym]["hex"],
+                }
+                for sym, addr, size in blocks
+            },
+        }
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 def _read_symbols_series_data(
@@ -412,21 +708,19 @@ def _read_symbols_series_data(
     if not symbol_list:
         raise ValueError("symbol_list is empty")
 
-    uid, mcu_resolved = pyocd_tool.resolve_probe(mcu or None)
-    resolved = pyocd_tool._resolve_symbols(elf, symbol_list)
+    resolved = _pt()._resolve_symbols(elf, symbol_list)
     blocks: list[tuple[str, int, int]] = []
     for sym in symbol_list:
         addr, sym_size = resolved[sym]
         blocks.append((sym, addr, sym_size if sym_size > 0 else 64))
 
-    session = pyocd_tool.open_session(uid, mcu_resolved)
-    try:
+    with _probe_session(mcu) as (uid, mcu_resolved, session):
         target = session.target
         core = target.cores[0]
         t0 = time.monotonic()
         samples: list[dict] = []
         for i in range(repeat):
-            read_map = pyocd_tool._read_blocks(target, core, blocks, halt=halt)
+            read_map = _pt()._read_blocks(target, core, blocks, halt=halt)
             symbols_out: dict[str, dict] = {}
             for sym in symbol_list:
                 addr, sym_size = resolved[sym]
@@ -454,8 +748,6 @@ def _read_symbols_series_data(
             "halt": halt,
             "samples": samples,
         }
-    finally:
-        session.close()
 
 
 @app.tool()
@@ -477,9 +769,9 @@ def read_symbols_series(
         mcu: MCU ターゲット。空なら自動選択。
         halt: True の場合、各サンプルで halt->read->resume を実施
     """
-    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    symbol_list = _parse_csv(symbols)
     if not symbol_list:
-        return json.dumps({"error": "symbols is empty"}, indent=2)
+        return _dumps({"error": "symbols is empty"})
     try:
         result = _read_symbols_series_data(
             elf=elf,
@@ -489,10 +781,9 @@ def read_symbols_series(
             interval_ms=int(interval_ms),
             halt=bool(halt),
         )
-        return json.dumps(result, indent=2)
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -514,9 +805,9 @@ def usb_audio_counters(
         mcu: MCU ターゲット。空なら自動選択。
         halt: True の場合、各サンプルで halt->read->resume を実施
     """
-    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    symbol_list = _parse_csv(symbols)
     if not symbol_list:
-        return json.dumps({"error": "symbols is empty"}, indent=2)
+        return _dumps({"error": "symbols is empty"})
     try:
         result = _read_symbols_series_data(
             elf=elf,
@@ -526,10 +817,9 @@ def usb_audio_counters(
             interval_ms=int(interval_ms),
             halt=bool(halt),
         )
-        return json.dumps(result, indent=2)
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -541,15 +831,14 @@ def resolve_symbol(elf: str, name: str) -> str:
         name: シンボル名またはパターン
     """
     try:
-        addr, sym_size = pyocd_tool._resolve_symbol(elf, name)
-        return json.dumps({
+        addr, sym_size = _pt()._resolve_symbol(elf, name)
+        return _dumps({
             "symbol": name,
             "address": f"0x{addr:08X}",
             "size": sym_size,
-        }, indent=2)
+        })
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 @app.tool()
@@ -559,19 +848,97 @@ def read_registers(mcu: str = "") -> str:
     Args:
         mcu: MCU ターゲット。空なら自動選択。
     """
-    ns = type("NS", (), {"mcu": mcu or None})()
     try:
-        result = pyocd_tool.cmd_regs(ns)
-        return json.dumps(result, indent=2)
+        with _probe_session(mcu) as (uid, mcu_resolved, session):
+            target = session.target
+            regs = _pt().read_core_registers(target, target.cores[0])
+        result = {"uid": uid, "mcu": mcu_resolved, "registers": regs}
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 # ===================================================================
 # DMA バッファ解析
 # ===================================================================
 
+_MAX_24 = 8388607
+
+
+def _i2s_range_pct(lo: int, hi: int) -> list[float]:
+    return [round(lo / _MAX_24 * 100, 1), round(hi / _MAX_24 * 100, 1)]
+
+
+def _decode_i2s_numpy(data: bytes) -> dict:
+    """I2S 24-bit フレームのデコード + 解析（NumPy ベクトル化版）。"""
+    n_frames = len(data) // 8
+    words = np.frombuffer(data, dtype="<u4", count=n_frames * 2).reshape(-1, 2)
+    # ARM little-endian I2S layout: ハーフワードを入れ替えた 32-bit 値の上位 24-bit がサンプル。
+    # int32 として算術右シフトすれば符号拡張は分岐なしで済む。
+    vals = ((words << 16) | (words >> 16)).view(np.int32) >> 8
+    l_vals, r_vals = vals[:, 0], vals[:, 1]
+
+    l_min, l_max = int(l_vals.min()), int(l_vals.max())
+    r_min, r_max = int(r_vals.min()), int(r_vals.max())
+    lr_match = int(np.count_nonzero(l_vals == r_vals))
+    all_zero = int(np.count_nonzero((l_vals == 0) & (r_vals == 0)))
+    return {
+        "frames": n_frames,
+        "analysis": {
+            "L_range": [l_min, l_max],
+            "R_range": [r_min, r_max],
+            "L_range_pct": _i2s_range_pct(l_min, l_max),
+            "R_range_pct": _i2s_range_pct(r_min, r_max),
+            "L_zero_crossings": int(np.count_nonzero(np.diff(l_vals >= 0))),
+            "R_zero_crossings": int(np.count_nonzero(np.diff(r_vals >= 0))),
+            "LR_match": f"{lr_match}/{n_frames}",
+            "all_zero_frames": f"{all_zero}/{n_frames}",
+        },
+        "sample_data": [
+            {"L": l, "R": r} for l, r in vals[:8].tolist()
+        ],
+    }
+
+
+def _decode_i2s_python(data: bytes) -> dict:
+    """I2S 24-bit フレームのデコード + 解析（NumPy 非使用時のフォールバック）。"""
+    n_frames = len(data) // 8
+
+    def _decode(w: int) -> int:
+        # ARM little-endian I2S layout: ハーフワード入れ替え → int32 化 (xor/sub) → 算術右シフト
+        swapped = ((w << 16) | (w >> 16)) & 0xFFFFFFFF
+        return ((swapped ^ 0x80000000) - 0x80000000) >> 8
+
+    # L/R ワード対を C レベルのイテレータで直接取り出す（中間ワードリストを作らない）
+    l_vals: list[int] = []
+    r_vals: list[int] = []
+    for wl, wr in struct.iter_unpack("<II", memoryview(data)[: n_frames * 8]):
+        l_vals.append(_decode(wl))
+        r_vals.append(_decode(wr))
+
+    l_min, l_max = min(l_vals), max(l_vals)
+    r_min, r_max = min(r_vals), max(r_vals)
+    l_crosses = sum((a >= 0) != (b >= 0) for a, b in zip(l_vals, l_vals[1:]))
+    r_crosses = sum((a >= 0) != (b >= 0) for a, b in zip(r_vals, r_vals[1:]))
+    lr_match = sum(l == r for l, r in zip(l_vals, r_vals))
+    all_zero = sum(l == 0 and r == 0 for l, r in zip(l_vals, r_vals))
+    return {
+        "frames": n_frames,
+        "analysis": {
+            "L_range": [l_min, l_max],
+            "R_range": [r_min, r_max],
+            "L_range_pct": _i2s_range_pct(l_min, l_max),
+            "R_range_pct": _i2s_range_pct(r_min, r_max),
+            "L_zero_crossings": l_crosses,
+            "R_zero_crossings": r_crosses,
+            "LR_match": f"{lr_match}/{n_frames}",
+            "all_zero_frames": f"{all_zero}/{n_frames}",
+        },
+        "sample_data": [
+            {"L": l, "R": r} for l, r in zip(l_vals[:8], r_vals[:8])
+        ],
+    }
+
 
 @app.tool()
 def read_dma_audio(address: str, size: int = 512, mcu: str = "") -> str:
@@ -585,89 +952,27 @@ def read_dma_audio(address: str, size: int = 512, mcu: str = "") -> str:
     addr = int(address, 16) if isinstance(address, str) else address
 
     try:
-        uid, mcu_resolved = pyocd_tool.resolve_probe(mcu or None)
-        session = pyocd_tool.open_session(uid, mcu_resolved)
-        try:
+        with _probe_session(mcu) as (_uid, _mcu_resolved, session):
             target = session.target
             target.halt()
             data = target.read_memory_block8(addr, size)
             target.resume()
-        finally:
-            session.close()
-
-        # Convert bytes to uint32 words (little-endian)
-        words = []
-        for i in range(0, len(data), 4):
-            w = struct.unpack_from("<I", bytes(data[i : i + 4]))[0]
-            words.append(w)
-
-        # Decode I2S 24-bit frames
-        frames = []
-        for i in range(0, len(words), 2):
-            if i + 1 >= len(words):
-                break
-            w0 = words[i]
-            w1 = words[i + 1]
-            # ARM little-endian I2S layout
-            l_hi = w0 & 0xFFFF
-            l_lo = (w0 >> 16) & 0xFFFF
-            r_hi = w1 & 0xFFFF
-            r_lo = (w1 >> 16) & 0xFFFF
-            l_val = ((l_hi << 16) | l_lo) >> 8
-            r_val = ((r_hi << 16) | r_lo) >> 8
-            # Sign extend from 24-bit
-            if l_val & 0x800000:
-                l_val -= 0x1000000
-            if r_val & 0x800000:
-                r_val -= 0x1000000
-            frames.append({"L": l_val, "R": r_val})
-
-        # Analysis
-        l_vals = [f["L"] for f in frames]
-        r_vals = [f["R"] for f in frames]
-        max_24 = 8388607
-
-        l_crosses = sum(
-            1 for i in range(1, len(l_vals)) if (l_vals[i] >= 0) != (l_vals[i - 1] >= 0)
-        )
-        r_crosses = sum(
-            1 for i in range(1, len(r_vals)) if (r_vals[i] >= 0) != (r_vals[i - 1] >= 0)
-        )
-        lr_match = sum(1 for l, r in zip(l_vals, r_vals) if l == r)
-        all_zero = sum(1 for l, r in zip(l_vals, r_vals) if l == 0 and r == 0)
 
-        return json.dumps(
+        # デコーダは空の入力で min() が失敗するため、先に 1 フレーム分あるか確認する
+        if len(data) < 8:
+            raise ValueError(f"size={size} は 1 フレーム (8 bytes) 未満です")
+        decode = _decode_i2s_numpy if np is not None else _decode_i2s_python
+        decoded = decode(bytes(data))
+
+        return _dumps(
             {
                 "success": True,
                 "address": f"0x{addr:08X}",
-                "frames": len(frames),
-                "analysis": {
-                    "L_range": [min(l_vals), max(l_vals)],
-                    "R_range": [min(r_vals), max(r_vals)],
-                    "L_range_pct": [
-                        round(min(l_vals) / max_24 * 100, 1),
-                        round(max(l_vals) / max_24 * 100, 1),
-                    ],
-                    "R_range_pct": [
-                        round(min(r_vals) / max_24 * 100, 1),
-                        round(max(r_vals) / max_24 * 100, 1),
-                    ],
-                    "L_zero_crossings": l_crosses,
-                    "R_zero_crossings": r_crosses,
-                    "LR_match": f"{lr_match}/{len(frames)}",
-                    "all_zero_frames": f"{all_zero}/{len(frames)}",
-                },
-                "sample_data": frames[:8],  # First 8 frames as preview
+                **decoded,  # frames, analysis, sample_data (first 8 frames as preview)
             },
-            indent=2,
         )
     except Exception as e:
-        import traceback
-
-        return json.dumps(
-            {"success": False, "error": str(e), "traceback": traceback.format_exc()},
-            indent=2,
-        )
+        return _error_json(e, success=False)
 
 
 # ===================================================================
@@ -684,15 +989,16 @@ def rtt_capture(duration: int = 5, mcu: str = "") -> str:
         mcu: MCU ターゲット。空なら自動選択。
     """
     try:
-        uid, mcu_resolved = pyocd_tool.resolve_probe(mcu or None)
+        uid, mcu_resolved = _pt().resolve_probe(mcu or None)
+        # 別プロセスの pyocd がプローブを使うため保持セッションを解放
+        _close_cached_sessions()
         result = _run(
             ["pyocd", "rtt", "-u", uid, "-t", mcu_resolved],
             timeout=duration + 5,
         )
-        return json.dumps(result, indent=2)
+        return _dumps(result)
     except Exception as e:
-        import traceback
-        return json.dumps({"error": str(e), "traceback": traceback.format_exc()}, indent=2)
+        return _error_json(e)
 
 
 # ---------------------------------------------------------------------------
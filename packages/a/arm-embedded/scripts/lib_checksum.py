@@ -7,22 +7,78 @@ Used by Claude Code hooks to:
 3. Detect untested changes at session stop
 
 Two snapshot files per session:
-- baseline: captured at SessionStart ($TMPDIR/claude_lib_baseline_<sid>.json)
-- tested:   updated after test pass  ($TMPDIR/claude_lib_tested_<sid>.json)
+- baseline: captured at SessionStart ($TMPDIR/claude_lib_baseline_<schema>_<sid>.json)
+- tested:   updated after test pass  ($TMPDIR/claude_lib_tested_<schema>_<sid>.json)
+
+<schema> is "v2" (BLAKE2b) or "v2-blake3" / "v2-xxh3" when those packages are installed.
 
 Stop hook compares current state against the NEWER of baseline/tested.
 This ensures that once tests pass, the hook doesn't re-fire until new changes occur.
+
+Small files are hashed from a single read(), mid-sized ones via hashlib.file_digest
+(3.11+), files of 1 MiB or more via mmap.
+Digests are memoized per project in a stat cache
+($TMPDIR/claude_lib_statcache_<schema>_<hash>.json, {path: [mtime_ns, size, digest]}),
+so only files whose mtime/size changed are re-read and re-hashed.
 """
 
 from __future__ import annotations
 
 import hashlib
 import json
+import mmap
 import os
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
 
-_EXTENSIONS = ("*.cc", "*.hh")
+_EXTENSIONS = (".cc", ".hh")
+# Directories under lib/ never scanned: build output and tool caches
+# (plus any hidden directory such as .cache / .ccls-cache / .git).
+_PRUNE_DIRS = frozenset({"build", "__pycache__"})
+_PRUNE_PREFIXES = (".", "cmake-build-")
+
+# orjson is optional (several times faster load/dump on large snapshots).
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Digest backend: blake3 / xxh3-128 when installed (several times faster than
+# BLAKE2b), otherwise hashlib's BLAKE2b-128. Change detection only, not security.
+try:
+    from blake3 import blake3 as _new_hasher
+
+    _ALGO = "blake3"
+except ImportError:
+    try:
+        from xxhash import xxh3_128 as _new_hasher
+
+        _ALGO = "xxh3"
+    except ImportError:
+        _new_hasher = partial(hashlib.blake2b, digest_size=16)
+        _ALGO = ""
+
+# Snapshot file schema. Bump when the digest algorithm changes so snapshots
+# written by an older version are ignored instead of reporting every file as changed.
+# The optional backend is part of the schema, so hooks running under Pythons with
+# different packages installed never compare digests from different algorithms.
+# v2: BLAKE2b-128 (v1: MD5)
+_SCHEMA = f"v2-{_ALGO}" if _ALGO else "v2"
+_MMAP_MIN_SIZE = 1 << 20
+# file_digest allocates a 256 KiB buffer per call, so it only pays off above that.
+_FILE_DIGEST_MIN_SIZE = 1 << 18
+_file_digest = getattr(hashlib, "file_digest", None)  # Python 3.11+
+# Below this many cache misses, thread pool startup costs more than it saves.
+_PARALLEL_MIN_FILES = 8
+# Files modified this recently are not stat-cached (coarse mtime on some filesystems).
+_RACY_WINDOW_NS = 2_000_000_000
+
+# Process-local parse cache for snapshot/stat-cache files:
+# {path: (mtime_ns, size, parsed)}. Returned dicts are shared; callers must not mutate.
+_json_cache: dict[str, tuple[int, int, dict]] = {}
 
 # Module-level session_id, set by hooks via set_session_id()
 _session_id: str = ""
@@ -34,23 +90,27 @@ def set_session_id(sid: str) -> None:
     _session_id = sid
 
 
+@lru_cache(maxsize=1)
 def _resolve_project_dir() -> str:
-    """Resolve project root from env or git."""
+    """Resolve project root from env, else the nearest ancestor with .git (memoized).
+
+    Same answer as `git rev-parse --show-toplevel` (a .git file covers worktrees
+    and submodules) without spawning git.
+    """
     project_dir = os.environ.get("CLAUDE_PROJECT_DIR", "")
     if project_dir:
         return project_dir
     try:
-        result = subprocess.run(
-            ["git", "rev-parse", "--show-toplevel"],
-            capture_output=True,
-            text=True,
-            timeout=5,
-        )
-        return result.stdout.strip()
-    except (subprocess.TimeoutExpired, FileNotFoundError):
+        cwd = Path.cwd().resolve()
+    except OSError:
         return ""
+    for d in (cwd, *cwd.parents):
+        if (d / ".git").exists():
+            return str(d)
+    return ""
 
 
+@lru_cache(maxsize=1)
 def _tmpdir() -> Path:
     return Path(os.environ.get("TMPDIR", "/tmp"))
 
@@ -59,46 +119,171 @@ def _baseline_path() -> Path:
     """Baseline snapshot: captured at SessionStart."""
     d = _tmpdir()
     if _session_id:
-        return d / f"claude_lib_baseline_{_session_id[-12:]}.json"
-    return d / "claude_lib_baseline.json"
+        return d / f"claude_lib_baseline_{_SCHEMA}_{_session_id[-12:]}.json"
+    return d / f"claude_lib_baseline_{_SCHEMA}.json"
 
 
 def _tested_path() -> Path:
     """Tested snapshot: updated after successful test run."""
     d = _tmpdir()
     if _session_id:
-        return d / f"claude_lib_tested_{_session_id[-12:]}.json"
-    return d / "claude_lib_tested.json"
+        return d / f"claude_lib_tested_{_SCHEMA}_{_session_id[-12:]}.json"
+    return d / f"claude_lib_tested_{_SCHEMA}.json"
+
+
+def _stat_cache_path(project_dir: str) -> Path:
+    """Stat cache: per project (digests do not depend on the session)."""
+    key = hashlib.md5(project_dir.encode()).hexdigest()[:12]
+    return _tmpdir() / f"claude_lib_statcache_{_SCHEMA}_{key}.json"
+
+
+def _is_pruned_dir(name: str) -> bool:
+    return name in _PRUNE_DIRS or name.startswith(_PRUNE_PREFIXES)
+
+
+def _hash_file(path: str | Path, size: int | None = None) -> str:
+    """Digest of a file using the selected backend (_ALGO).
+
+    Small files are read in one call. Mid-sized files go through
+    hashlib.file_digest (3.11+), which streams via one reused 256 KiB buffer
+    instead of a full-size bytes object. Files of _MMAP_MIN_SIZE or more are
+    hashed straight from an mmap.
+    """
+    with open(path, "rb") as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        if size >= _MMAP_MIN_SIZE:
+            h = _new_hasher()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+        elif size >= _FILE_DIGEST_MIN_SIZE and _file_digest is not None:
+            h = _file_digest(f, _new_hasher)
+        else:
+            h = _new_hasher()
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _hash_one(item: tuple[str, int]) -> str | None:
+    """_hash_file for pool workers: None if the file vanished or is unreadable."""
+    try:
+        return _hash_file(*item)
+    except (OSError, ValueError):
+        return None
 
 
 def compute_checksums(project_dir: str) -> dict[str, str]:
-    """Compute MD5 checksums for all lib/**/*.{cc,hh} files."""
+    """Compute checksums for all lib/**/*.{cc,hh} files (skipping _PRUNE_DIRS).
+
+    Files whose (mtime_ns, size) match the stat cache reuse the cached digest;
+    files modified within the last _RACY_WINDOW_NS are always re-hashed.
+    Cache misses are hashed on a thread pool (hashlib releases the GIL).
+    """
     lib_dir = Path(project_dir) / "lib"
     checksums: dict[str, str] = {}
     if not lib_dir.is_dir():
         return checksums
-    for ext in _EXTENSIONS:
-        for f in lib_dir.rglob(ext):
+
+    cache_path = _stat_cache_path(project_dir)
+    cache = _read_json(cache_path) or {}
+    new_cache: dict[str, list] = {}
+    misses: list[tuple[str, str, os.stat_result]] = []
+    # Single traversal for all extensions; relative dir computed once per directory.
+    for root, dirs, files in os.walk(lib_dir):
+        # Prune build output and tool caches that may hold generated sources.
+        dirs[:] = [d for d in dirs if not _is_pruned_dir(d)]
+        rel_root = os.path.relpath(root, project_dir)
+        for name in files:
+            if not name.endswith(_EXTENSIONS):
+                continue
+            full = os.path.join(root, name)
+            rel = os.path.join(rel_root, name)
             try:
-                data = f.read_bytes()
-                checksums[str(f.relative_to(project_dir))] = hashlib.md5(data).hexdigest()
+                st = os.stat(full)
             except OSError:
-                pass
+                continue
+            entry = cache.get(rel)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                checksums[rel] = entry[2]
+                new_cache[rel] = entry
+            else:
+                misses.append((rel, full, st))
+
+    if len(misses) >= _PARALLEL_MIN_FILES:
+        workers = min(32, (os.cpu_count() or 1) * 4, len(misses))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            digests = list(ex.map(_hash_one, ((f, st.st_size) for _, f, st in misses)))
+    else:
+        digests = [_hash_one((f, st.st_size)) for _, f, st in misses]
+    # Racily-clean guard (as in git's index): a file written in the same
+    # timestamp tick as our read could change again without its mtime/size
+    # moving, so recently modified files are hashed but not cached.
+    racy_cutoff = time.time_ns() - _RACY_WINDOW_NS
+    for (rel, _, st), digest in zip(misses, digests):
+        if digest is None:
+            continue
+        checksums[rel] = digest
+        if st.st_mtime_ns < racy_cutoff:
+            new_cache[rel] = [st.st_mtime_ns, st.st_size, digest]
+
+    if new_cache != cache:
+        _write_json(cache_path, new_cache)
     return checksums
 
 
 def _write_json(path: Path, data: dict) -> None:
+    """Write compact JSON atomically; skip the write if the bytes are unchanged.
+
+    Keys are sorted so the same content always serializes identically
+    (compute_checksums' order depends on which files were cache hits).
+    """
+    if orjson is not None:
+        new = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    else:
+        new = json.dumps(data, separators=(",", ":"), sort_keys=True, ensure_ascii=False).encode()
     try:
-        path.write_text(json.dumps(data))
+        if path.read_bytes() == new:
+            _remember(path, data)
+            return
     except OSError:
         pass
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_bytes(new)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return
+    _remember(path, data)
+
+
+def _remember(path: Path, data: dict) -> None:
+    """Record data as the parsed content of path at its current (mtime_ns, size)."""
+    try:
+        st = path.stat()
+    except OSError:
+        return
+    _json_cache[str(path)] = (st.st_mtime_ns, st.st_size, data)
 
 
-def _read_json(path: Path) -> dict[str, str] | None:
+def _read_json(path: Path) -> dict | None:
+    """Parse a JSON file; reuses the last parse/write in this process if unchanged."""
+    key = str(path)
     try:
-        return json.loads(path.read_text())
-    except (OSError, json.JSONDecodeError):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            cached = _json_cache.get(key)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return cached[2]
+            raw = f.read()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except (OSError, ValueError):
         return None
+    _json_cache[key] = (st.st_mtime_ns, st.st_size, data)
+    return data
 
 
 def save_snapshot() -> None:
@@ -114,9 +299,7 @@ def save_snapshot() -> None:
     _write_json(_baseline_path(), checksums)
     # Clear stale tested snapshot from previous session with same suffix
     try:
-        tp = _tested_path()
-        if tp.exists():
-            tp.unlink()
+        _tested_path().unlink(missing_ok=True)
     except OSError:
         pass
 
@@ -153,7 +336,7 @@ def _load_reference() -> dict[str, str] | None:
     # 3. Shared fallbacks (no session_id, or different session)
     if _session_id:
         d = _tmpdir()
-        for name in ("claude_lib_tested.json", "claude_lib_baseline.json"):
+        for name in (f"claude_lib_tested_{_SCHEMA}.json", f"claude_lib_baseline_{_SCHEMA}.json"):
             ref = _read_json(d / name)
             if ref is not None:
                 return ref
@@ -173,24 +356,20 @@ def changed_files() -> list[str]:
 
     old = _load_reference()
     if old is None:
-        return _git_diff_fallback()
+        return _git_diff_fallback(project_dir)
 
     current = compute_checksums(project_dir)
-    changed = []
-    for path, checksum in current.items():
-        if old.get(path) != checksum:
-            changed.append(path)
-    for path in old:
-        if path not in current:
-            changed.append(path)
-    return changed
+    # Symmetric difference of (path, digest) pairs = added + removed + modified
+    # (a modified path appears once from each side; the set collapses it).
+    return sorted({path for path, _ in current.items() ^ old.items()})
 
 
-def _git_diff_fallback() -> list[str]:
+def _git_diff_fallback(project_dir: str) -> list[str]:
     """Fallback: detect unstaged lib/ C++ changes via git."""
     try:
+        # -C: the "lib/" pathspec is relative to the project root, not the hook's cwd
         result = subprocess.run(
-            ["git", "diff", "--name-only", "--", "lib/"],
+            ["git", "-C", project_dir, "diff", "--name-only", "--", "lib/"],
             capture_output=True,
             text=True,
             timeout=5,
@@ -198,15 +377,13 @@ def _git_diff_fallback() -> list[str]:
     except (subprocess.TimeoutExpired, FileNotFoundError):
         return []
     files = [f for f in result.stdout.strip().split("\n") if f]
-    return [f for f in files if f.endswith((".cc", ".hh"))]
+    return [f for f in files if f.endswith(_EXTENSIONS)]
 
 
 def cleanup_snapshot() -> None:
     """Remove all session snapshot files."""
     for path_fn in (_baseline_path, _tested_path):
         try:
-            p = path_fn()
-            if p.exists():
-                p.unlink()
+            path_fn().unlink(missing_ok=True)
         except OSError:
             pass
@@ -19,8 +19,12 @@ MCU 自動検出（DBGMCU_IDCODE + pyOCD BoardInfo）、複数プローブ対応
     regs    [--mcu MCU]          レジスタ読み取り
     reset   [--mcu MCU]          ターゲットリセット
     run-read <addr> <size> <ms> [--mcu MCU]  reset→run→halt→read
+    serve                        stdin の JSON 行 (argv 配列) を順に実行（セッション再利用）
     cleanup                      ゾンビプロセス終了
 
+  --mcu を取るコマンドは --uid UID でプローブを直接指定できる（USB 列挙を省略）。
+  --compact（コマンドの前に指定）で結果 JSON を 1 行で出力する。
+
 MCU 自動検出の仕組み:
   1. pyOCD BoardInfo（Nucleo/Discovery 等は board_id から自動判別）
   2. DBGMCU_IDCODE レジスタ（DEV_ID で MCU ファミリ判定）
@@ -30,33 +34,59 @@ MCU 自動検出の仕組み:
 from __future__ import annotations
 
 import argparse
+import array
+import hashlib
+import importlib.util
 import json
 import logging
+import mmap
 import os
+import pickle
 import re
 import shutil
 import signal
 import struct
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 # pyOCD がインポートできない場合、pyocd を持つ Python で再起動を試みる
+def _version_key(p: Path) -> tuple:
+    """~/.pyenv/versions/<ver>/bin/python3 の <ver> を数値比較できるキーにする（3.12 > 3.9）。"""
+    return tuple(int(x) if x.isdigit() else -1 for x in re.split(r"[.\-]", p.parent.parent.name))
+
+
+def _pyocd_python_candidates() -> Iterator[Path]:
+    """pyocd を探す候補を 1 つずつ返す（見つかった時点で以降の glob/stat を省く）。"""
+    which = shutil.which("python3")
+    if which:
+        yield Path(which)
+    yield from sorted(Path.home().glob(".pyenv/versions/*/bin/python3"), key=_version_key, reverse=True)
+    yield Path("/opt/homebrew/bin/python3")
+    yield Path("/usr/local/bin/python3")
+
+
+# pyocd を import せずに存在だけ確認する（pyocd の __init__ は重い）
+_HAS_PYOCD_SNIPPET = "import importlib.util,sys; sys.exit(importlib.util.find_spec('pyocd') is None)"
+
+
 def _find_pyocd_python() -> str | None:
     """pyocd モジュールを持つ Python インタプリタを探す。"""
-    candidates = [
-        *sorted(Path.home().glob(".pyenv/versions/*/bin/python3"), reverse=True),
-        Path("/opt/homebrew/bin/python3"),
-        Path("/usr/local/bin/python3"),
-    ]
-    for p in candidates:
-        if not p.exists():
+    seen: set[str] = {os.path.realpath(sys.executable)}
+    for p in _pyocd_python_candidates():
+        real = os.path.realpath(p)
+        if real in seen or not p.exists():
             continue
+        seen.add(real)
         try:
             r = subprocess.run(
-                [str(p), "-c", "import pyocd"],
+                [str(p), "-c", _HAS_PYOCD_SNIPPET],
                 capture_output=True, timeout=5,
             )
             if r.returncode == 0:
@@ -66,15 +96,37 @@ def _find_pyocd_python() -> str | None:
     return None
 
 
+# _find_pyocd_python() の結果キャッシュ（候補毎の subprocess 起動を 2 回目以降省く）
+_PYOCD_PYTHON_CACHE = Path(__file__).resolve().parent / ".pyocd_python"
+
+
 def _maybe_reexec() -> None:
     """pyocd が使えない Python で起動された場合、正しい Python で再実行する。"""
-    try:
-        import pyocd  # noqa: F401
+    if importlib.util.find_spec("pyocd") is not None:
         return
-    except ImportError:
-        pass
 
+    try:
+        cached = _PYOCD_PYTHON_CACHE.read_text().strip()
+    except OSError:
+        cached = ""
+    # 環境変数で 1 回だけに制限（キャッシュ先も pyocd を失っていた場合の exec ループ防止）
+    if (cached and cached != sys.executable and os.access(cached, os.X_OK)
+            and not os.environ.get("_PYOCD_TOOL_REEXEC")):
+        os.environ["_PYOCD_TOOL_REEXEC"] = "1"
+        os.execv(cached, [cached, *sys.argv])
+
+    # キャッシュ無し、または自分自身がキャッシュされた Python なのに pyocd が無い
+    # （アンインストール等）→ 破棄して再探索
     python_path = _find_pyocd_python()
+    try:
+        if python_path:
+            tmp = _PYOCD_PYTHON_CACHE.with_name(f"{_PYOCD_PYTHON_CACHE.name}.{os.getpid()}.tmp")
+            tmp.write_text(python_path + "\n")
+            os.replace(tmp, _PYOCD_PYTHON_CACHE)
+        elif cached:
+            _PYOCD_PYTHON_CACHE.unlink(missing_ok=True)
+    except OSError:
+        pass
     if python_path and python_path != sys.executable:
         os.execv(python_path, [python_path, *sys.argv])
 
@@ -89,15 +141,16 @@ logging.getLogger("pyocd.coresight.component").setLevel(logging.CRITICAL)
 logging.getLogger("pyocd.coresight").setLevel(logging.CRITICAL)
 
 # pyOCD imports
-try:
-    from pyocd.core.helpers import ConnectHelper
+# pyocd パッケージは import 時に全サブモジュールを読み込み重いため、API は
+# _load_pyocd_api() で初回使用時に読み込む（cleanup やキャッシュ済み list では不要）。
+# PYOCD_API はインストールの有無（読み込み失敗後は False）を示す。
+PYOCD_API = importlib.util.find_spec("pyocd") is not None
+ConnectHelper: Any = None
+FileProgrammer: Any = None
+MemoryLoader: Any = None
+aggregator: Any = None
+if TYPE_CHECKING:
     from pyocd.core.session import Session
-    from pyocd.flash.file_programmer import FileProgrammer
-    from pyocd.flash.loader import MemoryLoader
-    from pyocd.probe import aggregator
-    PYOCD_API = True
-except ImportError:
-    PYOCD_API = False
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROBE_CACHE_PATH = SCRIPT_DIR / "probe_cache.json"
@@ -146,10 +199,74 @@ DEFAULT_PYOCD_DOUBLE_BUFFER = _env_bool("PYOCD_DOUBLE_BUFFER", True)
 DEFAULT_PYOCD_FAST_RESET = _env_bool("PYOCD_FAST_RESET", True)
 DEFAULT_PYOCD_SMART_SKIP = _env_bool("PYOCD_SMART_SKIP", True)
 DEFAULT_PYOCD_NO_RESET = _env_bool("PYOCD_NO_RESET", False)
+# IDCODE 検出後に target reset する（既定は resume のみ。reset は hold/post delay 分遅い）
+DEFAULT_PYOCD_DETECT_RESET = _env_bool("PYOCD_DETECT_RESET", False)
 DEFAULT_PYOCD_ERASE = os.environ.get("PYOCD_ERASE", "sector").strip().lower()
+# ELF シンボルテーブルを ~/.cache/pyocd_tool/ に保存し、CLI 起動毎の nm 実行を省く
+DEFAULT_SYMTAB_DISK_CACHE = _env_bool("PYOCD_TOOL_CACHE", False)
 if DEFAULT_PYOCD_ERASE not in {"auto", "sector", "chip"}:
     DEFAULT_PYOCD_ERASE = "sector"
 
+# 切断時の DP power-down ACK 待ちの上限 (ms)。pyOCD 既定は 5 秒で、H7/F7 等
+# power-down を ACK しないターゲットでは session.close() 毎に 5 秒待たされる。
+# 0 以下で pyOCD 既定のまま。power-up（接続時）の待ち時間には影響しない。
+DEFAULT_PYOCD_POWER_DOWN_TIMEOUT_MS = _env_int("PYOCD_POWER_DOWN_TIMEOUT_MS", 100)
+
+
+def _install_fast_power_down(timeout_s: float) -> None:
+    """DebugPort.power_down_debug を ACK 待ち timeout_s の版に差し替える。
+
+    pyOCD の実装と同じ手順だが、待ち時間は自前の Timeout で持つ。モジュール
+    グローバル DP_POWER_REQUEST_TIMEOUT は書き換えない（並行セッションの
+    power_up_debug が短縮値を読んでしまうため）。
+    """
+    try:
+        from pyocd.coresight import dap
+        from pyocd.utility.timeout import Timeout
+    except ImportError:
+        return
+    if getattr(dap.DebugPort.power_down_debug, "_fast_power_down", False):
+        return
+    acks = dap.CDBGPWRUPACK | dap.CSYSPWRUPACK
+    timeout_s = min(timeout_s, dap.DP_POWER_REQUEST_TIMEOUT)
+
+    def power_down_debug(self) -> bool:
+        if self.disable_debug_port_hook():
+            return True
+        # system → debug の順に落とす（ADIv5/v6 の制約）。各段で ACK を待つ
+        for request, expected in ((dap.CDBGPWRUPREQ, dap.CDBGPWRUPACK), (0, 0)):
+            self.write_reg(dap.DP_CTRL_STAT, request | dap.MASKLANE | dap.TRNNORMAL)
+            with Timeout(timeout_s) as time_out:
+                while time_out.check():
+                    if (self.read_reg(dap.DP_CTRL_STAT) & acks) == expected:
+                        break
+                else:
+                    return False
+        return True
+
+    power_down_debug._fast_power_down = True  # type: ignore[attr-defined]
+    dap.DebugPort.power_down_debug = power_down_debug
+
+
+def _load_pyocd_api() -> bool:
+    """pyOCD API をインポートしてモジュールグローバルに保持する。使えなければ False。"""
+    global PYOCD_API, ConnectHelper, FileProgrammer, MemoryLoader, aggregator
+    if aggregator is not None:
+        return True
+    if not PYOCD_API:
+        return False
+    try:
+        from pyocd.core.helpers import ConnectHelper
+        from pyocd.flash.file_programmer import FileProgrammer
+        from pyocd.flash.loader import MemoryLoader
+        from pyocd.probe import aggregator
+    except ImportError:
+        PYOCD_API = False
+        return False
+    if DEFAULT_PYOCD_POWER_DOWN_TIMEOUT_MS > 0:
+        _install_fast_power_down(DEFAULT_PYOCD_POWER_DOWN_TIMEOUT_MS / 1000.0)
+    return True
+
 # PYOCD_DEBUG_FREQ_HZ が未指定のときのみ target family preset を使う。
 DEFAULT_PYOCD_DEBUG_FREQ_PRESETS: list[tuple[str, int]] = [
     ("stm32h7", _env_int("PYOCD_DEBUG_FREQ_HZ_H7", 12_000_000)),
@@ -192,7 +309,7 @@ STM32_DEV_ID_TABLE: dict[int, str] = {
     0x442: "stm32f091xx",   # F09x/F07x
     0x445: "stm32f042xx",   # F04x
     0x448: "stm32f070xb",   # F07x/F070xB
-    0x447: "stm32l011xx",   # L0 Cat.1
+    0x457: "stm32l011xx",   # L0 Cat.1
     0x425: "stm32l031xx",   # L0 Cat.2
     0x417: "stm32l053xx",   # L0 Cat.3
     0x447: "stm32l071xx",   # L0 Cat.5
@@ -205,7 +322,6 @@ STM32_DEV_ID_TABLE: dict[int, str] = {
     0x438: "stm32f334xx",   # F334
     0x439: "stm32f302x8",   # F301/F302x8/F318
     0x446: "stm32f303xx",   # F303xE/F398
-    0x449: "stm32f446xx",   # F446
     0x413: "stm32f407xx",   # F405/F407/F415/F417
     0x419: "stm32f427xx",   # F427/F429/F437/F439
     0x421: "stm32f446xx",   # F446 (alt)
@@ -232,7 +348,7 @@ STM32_DEV_ID_TABLE: dict[int, str] = {
     0x497: "stm32wle5xx",   # WLE5/WL55
     # Cortex-M7 (F7/H7)
     0x452: "stm32f72xxx",   # F72x/F73x
-    0x449: "stm32f74xxx",   # F74x/F75x (shares with F446, distinguish by CPUID)
+    0x449: "stm32f74xxx",   # F74x/F75x (Cortex-M4 の場合は STM32_DEV_ID_BY_CPUID で F446)
     0x451: "stm32f76xxx",   # F76x/F77x
     0x450: "stm32h750xx",   # H743/H750/H753/H755
     0x480: "stm32h7a3xx",   # H7A3/H7B3/H7B0
@@ -246,6 +362,11 @@ STM32_DEV_ID_TABLE: dict[int, str] = {
     0x478: "stm32h503xx",   # H503
 }
 
+# DEV_ID がファミリ間で重複するもの: (DEV_ID, CPUID PARTNO) → MCU。STM32_DEV_ID_TABLE より優先。
+STM32_DEV_ID_BY_CPUID: dict[tuple[int, int], str] = {
+    (0x449, 0xC24): "stm32f446xx",  # Cortex-M4 なら F446（Cortex-M7 は F74x/F75x）
+}
+
 # DBGMCU_IDCODE アドレス候補（ファミリによって異なる）
 DBGMCU_ADDRS = [
     0xE0042000,  # F0/F1/F2/F3/F4/L0/L1/G0/G4/WB
@@ -256,31 +377,74 @@ DBGMCU_ADDRS = [
 
 # ── Probe Cache ──
 
+# プロセス内キャッシュ（mtime で外部更新を検知）。update は dirty を立てるだけで、
+# 書き込みは flush_probe_cache() でまとめて 1 回行う。
+_probe_cache: dict[str, dict] | None = None
+_probe_cache_mtime: int | None = None
+_probe_cache_dirty = False
+
+
+def _probe_cache_file_mtime() -> int | None:
+    try:
+        return PROBE_CACHE_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
 def load_probe_cache() -> dict[str, dict]:
-    """probe_cache.json を読み込む。UID → {mcu, board, name} のマッピング。"""
-    if PROBE_CACHE_PATH.exists():
+    """probe_cache.json を読み込む。UID → {mcu, board, name} のマッピング。
+
+    ファイルが前回読み込み時から変わっていなければメモリ上の dict を返す。
+    """
+    global _probe_cache, _probe_cache_mtime, _probe_cache_dirty  # noqa: PLW0603
+    mtime = _probe_cache_file_mtime()
+    if _probe_cache is not None and (_probe_cache_dirty or mtime == _probe_cache_mtime):
+        return _probe_cache
+
+    cache: dict[str, dict] = {}
+    if mtime is not None:
         try:
             with open(PROBE_CACHE_PATH) as f:
                 data = json.load(f)
             # v2 format: {probes: {uid: {mcu, board, name}}}
-            return data.get("probes", {})
-        except (json.JSONDecodeError, KeyError):
-            return {}
-    return {}
+            cache = data.get("probes", {})
+        except (OSError, json.JSONDecodeError, KeyError):
+            cache = {}
+    _probe_cache, _probe_cache_mtime, _probe_cache_dirty = cache, mtime, False
+    return cache
 
 
 def save_probe_cache(cache: dict[str, dict]) -> None:
-    """probe_cache.json を書き込む。"""
-    with open(PROBE_CACHE_PATH, "w") as f:
-        json.dump({"_comment": "Auto-generated by pyocd_tool.py. Do not edit manually.", "probes": cache}, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    """probe_cache.json を書き込む（一時ファイル経由でアトミックに置換）。"""
+    global _probe_cache, _probe_cache_mtime, _probe_cache_dirty  # noqa: PLW0603
+    payload = json.dumps(
+        {"_comment": "Auto-generated by pyocd_tool.py. Do not edit manually.", "probes": cache},
+        separators=(",", ":"),
+    ).encode() + b"\n"
+    tmp = PROBE_CACHE_PATH.with_name(f"{PROBE_CACHE_PATH.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
+    os.replace(tmp, PROBE_CACHE_PATH)
+    _probe_cache, _probe_cache_mtime, _probe_cache_dirty = cache, _probe_cache_file_mtime(), False
 
 
 def update_probe_cache(uid: str, mcu: str, board: str | None = None, name: str | None = None) -> None:
-    """キャッシュに1エントリ追加/更新。"""
-    cache = load_probe_cache()
-    cache[uid] = {"mcu": mcu, "board": board, "name": name}
-    save_probe_cache(cache)
+    """キャッシュに1エントリ追加/更新（メモリのみ。flush_probe_cache() で書き出す）。"""
+    global _probe_cache_dirty  # noqa: PLW0603
+    load_probe_cache()[uid] = {"mcu": mcu, "board": board, "name": name}
+    _probe_cache_dirty = True
+
+
+def flush_probe_cache() -> None:
+    """未保存の update_probe_cache() があれば probe_cache.json に書き出す。"""
+    if _probe_cache_dirty and _probe_cache is not None:
+        try:
+            save_probe_cache(_probe_cache)
+        except OSError:
+            pass
 
 
 # ── MCU Auto-Detection ──
@@ -302,15 +466,19 @@ def detect_mcu_from_idcode(uid: str) -> str | None:
     汎用プローブ（STLINK-V3 単体等）で使用。
 
     under-reset モードで接続し、IDCODE を読んでから切断する。
-    ターゲットの状態に影響を与えない。
+    接続時はリセットベクタで停止しているため、切断時の resume でファームウェアが
+    先頭から走り出す（reset し直すのと同じ状態になる）。
     """
-    if not PYOCD_API:
+    if not _load_pyocd_api():
         return None
 
     try:
         session = ConnectHelper.session_with_chosen_probe(
             unique_id=uid,
-            options={"connect_mode": "under-reset", "resume_on_disconnect": False},
+            options={
+                "connect_mode": "under-reset",
+                "resume_on_disconnect": not DEFAULT_PYOCD_DETECT_RESET,
+            },
         )
         session.open()
     except Exception:
@@ -319,16 +487,28 @@ def detect_mcu_from_idcode(uid: str) -> str | None:
     try:
         target = session.target
 
-        # CPUID を読んでコアタイプを確認
+        # CPUID（コアタイプ）と 1 つ目の DBGMCU_IDCODE 候補を遅延読み出しで同じ転送に
+        # まとめる（大半のファミリは 1 往復で済む）。フォールト時は従来どおり 1 つずつ読む。
+        dev_id = None
+        remaining = DBGMCU_ADDRS
         try:
-            cpuid = target.read32(0xE000ED00)
-            partno = (cpuid >> 4) & 0xFFF
+            cpuid_read = target.read32(0xE000ED00, now=False)
+            idcode_read = target.read32(DBGMCU_ADDRS[0], now=False)
+            partno = (cpuid_read() >> 4) & 0xFFF
+            idcode = idcode_read()
+            if idcode != 0:
+                dev_id = idcode & 0xFFF
+                remaining = []
+            else:
+                remaining = DBGMCU_ADDRS[1:]
         except Exception:
-            partno = 0
+            try:
+                partno = (target.read32(0xE000ED00) >> 4) & 0xFFF
+            except Exception:
+                partno = 0
 
-        # DBGMCU_IDCODE を複数アドレスから試行
-        dev_id = None
-        for addr in DBGMCU_ADDRS:
+        # 残りの DBGMCU_IDCODE 候補を試行
+        for addr in remaining:
             try:
                 idcode = target.read32(addr)
                 if idcode != 0:
@@ -340,11 +520,8 @@ def detect_mcu_from_idcode(uid: str) -> str | None:
         if dev_id is None:
             return None
 
-        mcu = STM32_DEV_ID_TABLE.get(dev_id)
+        mcu = STM32_DEV_ID_BY_CPUID.get((dev_id, partno)) or STM32_DEV_ID_TABLE.get(dev_id)
         if mcu:
-            # DEV_ID 0x449 は F74x と F446 で重複 → CPUID で区別
-            if dev_id == 0x449 and partno == 0xC24:
-                mcu = "stm32f446xx"
             return mcu
 
         # 未知の DEV_ID — CPUID から Cortex コアタイプだけでも返す
@@ -354,19 +531,25 @@ def detect_mcu_from_idcode(uid: str) -> str | None:
         core_name = core_map.get(partno, f"unknown-core-0x{partno:03x}")
         return f"unknown_stm32_devid_0x{dev_id:03x}_{core_name}"
     finally:
-        try:
-            session.target.reset()
-        except Exception:
-            pass
+        if DEFAULT_PYOCD_DETECT_RESET:
+            try:
+                session.target.reset()
+            except Exception:
+                pass
         session.close()
 
 
+# STM32 の target 名: stm32XXXXXX + パッケージ (t/tx/rx etc)
+_STM32_TARGET_RE = re.compile(r"(stm32[a-z]\d{3}[a-z]{2})")
+# `pyocd list` の行: <#> <probe 名> <UID> <target>
+_PYOCD_LIST_RE = re.compile(r"\s*(\d+)\s+(.+?)\s+([0-9A-Fa-f]{16,})\s+(.*)")
+
+
 def _normalize_target(target: str) -> str:
     """pyOCD target 名を正規化。
     'stm32f407vgtx' → 'stm32f407vg'  (末尾のパッケージコード除去)
     """
-    # STM32 の target 名: stm32XXXXXX + パッケージ (t/tx/rx etc)
-    m = re.match(r"(stm32[a-z]\d{3}[a-z]{2})", target)
+    m = _STM32_TARGET_RE.match(target)
     if m:
         return m.group(1)
     # フォールバック: そのまま返す
@@ -377,36 +560,43 @@ def _normalize_target(target: str) -> str:
 
 def list_probes() -> list[dict]:
     """接続中の全プローブを取得。MCU を自動検出する。"""
-    if not PYOCD_API:
+    if not _load_pyocd_api():
         return _list_probes_cli()
 
     probes = aggregator.DebugProbeAggregator.get_all_connected_probes()
     cache = load_probe_cache()
-    result = []
 
+    # 1. pyOCD BoardInfo → 2. キャッシュ の順で MCU を決定
+    found: list[tuple[Any, str | None, str | None]] = []
     for p in probes:
         uid = p.unique_id
-
-        # 1. pyOCD BoardInfo から取得
         mcu = detect_mcu_from_board_info(p)
         board = None
         board_info = getattr(p, "associated_board_info", None)
         if board_info:
             board = getattr(board_info, "name", None)
 
-        # 2. キャッシュから取得
         if not mcu and uid in cache:
             mcu = cache[uid].get("mcu")
             board = board or cache[uid].get("board")
+        found.append((p, mcu, board))
+
+    # 3. mcu がまだ不明 → DBGMCU_IDCODE で自動検出（初回のみ）。
+    #    プローブ毎に独立した USB/SWD 接続なので並列に実行する。
+    todo = [p.unique_id for p, mcu, _ in found if not mcu]
+    detected: dict[str, str | None] = {}
+    if len(todo) == 1:
+        detected[todo[0]] = detect_mcu_from_idcode(todo[0])
+    elif todo:
+        with ThreadPoolExecutor(max_workers=min(8, len(todo))) as ex:
+            detected = dict(zip(todo, ex.map(detect_mcu_from_idcode, todo)))
 
-        # 3. mcu がまだ不明 → DBGMCU_IDCODE で自動検出（初回のみ）
-        if not mcu:
-            detected = detect_mcu_from_idcode(uid)
-            if detected:
-                mcu = detected
-                update_probe_cache(uid, mcu, board, p.product_name)
+    result = []
+    for p, mcu, board in found:
+        uid = p.unique_id
+        mcu = mcu or detected.get(uid)
 
-        # キャッシュ更新（BoardInfo で取得できた場合もキャッシュに反映）
+        # キャッシュ更新（BoardInfo / IDCODE で取得できた場合）
         if mcu and (uid not in cache or cache[uid].get("mcu") != mcu):
             update_probe_cache(uid, mcu, board, p.product_name)
 
@@ -418,6 +608,7 @@ def list_probes() -> list[dict]:
             "board": board,
             "name": f"{p.product_name}{' ' + board if board else ''}",
         })
+    flush_probe_cache()
     return result
 
 
@@ -427,7 +618,7 @@ def _list_probes_cli() -> list[dict]:
         r = subprocess.run(["pyocd", "list"], capture_output=True, text=True, timeout=10)
         probes = []
         for line in r.stdout.splitlines():
-            m = re.match(r'\s*(\d+)\s+(.+?)\s+([0-9A-Fa-f]{16,})\s+(.*)', line)
+            m = _PYOCD_LIST_RE.match(line)
             if m:
                 probes.append({
                     "uid": m.group(3),
@@ -442,16 +633,29 @@ def _list_probes_cli() -> list[dict]:
         return []
 
 
-def resolve_probe(mcu: str | None) -> tuple[str, str]:
+def resolve_probe(mcu: str | None, uid: str | None = None) -> tuple[str, str]:
     """
     MCU 名からプローブ UID と実際のターゲット名を解決する。
 
     MCU 自動検出により、ほとんどの場合 --mcu 指定不要。
     複数プローブ接続中は --mcu で対象を特定。
+    --uid 指定時は USB 列挙を省き、probe_cache.json の MCU（無ければ --mcu）を使う。
+    どちらも無い場合のみ列挙して、その UID のプローブから解決する。
 
     Returns: (uid, mcu_target)
     """
+    if uid:
+        cached_mcu = load_probe_cache().get(uid, {}).get("mcu")
+        if cached_mcu and (not mcu or cached_mcu.lower().startswith(mcu.lower())):
+            return uid, cached_mcu
+        if mcu:
+            return uid, mcu
+
     probes = list_probes()
+    if uid:
+        probes = [p for p in probes if p["uid"] == uid]
+        if not probes:
+            raise RuntimeError(f"プローブ {uid} が接続されていません")
 
     if not probes:
         raise RuntimeError("プローブが接続されていません")
@@ -511,6 +715,34 @@ def resolve_probe(mcu: str | None) -> tuple[str, str]:
 
 # ── Session Management ──
 
+# serve モード中は (uid, mcu) 毎に開いたセッションを保持し、コマンド間で使い回す
+_keep_sessions = False
+_kept_sessions: dict[tuple[str, str], Session] = {}
+
+
+class _KeptSession:
+    """保持中セッションのプロキシ。各コマンドの session.close() では切断しない。"""
+
+    def __init__(self, session: Session) -> None:
+        self._session = session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+    def close(self) -> None:
+        pass
+
+
+def close_kept_sessions() -> None:
+    """serve モードで保持しているセッションをすべて閉じる。"""
+    while _kept_sessions:
+        _, session = _kept_sessions.popitem()
+        try:
+            session.close()
+        except Exception:
+            pass
+
+
 def open_session(
     uid: str,
     mcu: str,
@@ -519,10 +751,44 @@ def open_session(
 ) -> Session:
     """pyOCD セッションを開く。
 
+    serve モードでは追加オプション無しのセッションを保持して再利用する
+    （connect_mode="halt" の場合は再利用時に halt する）。
+    """
+    if not _keep_sessions:
+        return _open_session(uid, mcu, connect_mode, session_options)
+
+    key = (uid, mcu)
+    kept = _kept_sessions.get(key)
+    if kept is not None and kept.is_open and not session_options:
+        if connect_mode == "halt":
+            kept.target.halt()
+        return _KeptSession(kept)
+
+    # プローブは排他なので、同じプローブの保持セッションは先に閉じる
+    for k in [k for k in _kept_sessions if k[0] == uid]:
+        try:
+            _kept_sessions.pop(k).close()
+        except Exception:
+            pass
+    session = _open_session(uid, mcu, connect_mode, session_options)
+    if session_options:
+        return session
+    _kept_sessions[key] = session
+    return _KeptSession(session)
+
+
+def _open_session(
+    uid: str,
+    mcu: str,
+    connect_mode: str,
+    session_options: dict[str, Any] | None,
+) -> Session:
+    """pyOCD セッションを開く。
+
     接続失敗時は under-reset リカバリを1回だけ試みる。
     リカバリが安全な場合のみ（TransferFault 等の接続系エラー）実行する。
     """
-    if not PYOCD_API:
+    if not _load_pyocd_api():
         raise RuntimeError("pyOCD Python API が利用できません (pip install pyocd)")
 
     def _build_options(mode: str) -> dict[str, Any]:
@@ -603,7 +869,7 @@ def cmd_list(args: argparse.Namespace) -> dict:
 
 def cmd_status(args: argparse.Namespace) -> dict:
     """ターゲット状態。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     session = open_session(uid, mcu)
     try:
         target = session.target
@@ -682,17 +948,29 @@ def _flash_with_pyocd(
         setattr(boot_memory, "are_erased_sectors_readable", True)
 
     try:
-        data = binary.read_bytes()
-        loader = MemoryLoader(
-            session,
-            chip_erase=erase,
-            smart_flash=smart_skip,
-            trust_crc=trust_crc,
-            no_reset=True,  # We reset once at the end from cmd_flash().
-        )
-        loader.add_data(boot_memory.start, list(data))
-        enabled_regions = _enable_double_buffer_if_supported(loader) if double_buffer else 0
-        loader.commit()
+        # mmap: イメージ全体を bytes に読み込まず、ページキャッシュを直接参照する
+        with open(binary, "rb") as fh:
+            # 長さ 0 の mmap は ValueError になるため先に弾く
+            if os.fstat(fh.fileno()).st_size == 0:
+                raise RuntimeError(f"イメージが空です: {binary}")
+            image = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            loader = MemoryLoader(
+                session,
+                chip_erase=erase,
+                smart_flash=smart_skip,
+                trust_crc=trust_crc,
+                no_reset=True,  # We reset once at the end from cmd_flash().
+            )
+            # memoryview: 領域分割時のスライスもコピー無し（int リスト化しない）
+            loader.add_data(boot_memory.start, memoryview(image))
+            enabled_regions = _enable_double_buffer_if_supported(loader) if double_buffer else 0
+            loader.commit()
+        finally:
+            try:
+                image.close()
+            except BufferError:
+                pass  # 失敗時に builder がスライスを保持している場合は GC に任せる
         return {
             "double_buffer_regions": enabled_regions,
             "smart_skip_forced": force_erased_readable,
@@ -702,9 +980,56 @@ def _flash_with_pyocd(
             setattr(boot_memory, "are_erased_sectors_readable", original_erased_readable)
 
 
+# Linux: 子プロセスに PR_SET_PDEATHSIG を設定し、本プロセスが kill されたら道連れにする
+# （書き込み途中で親が落ちると CubeProgrammer が USB を掴んだまま残るため）
+_PR_SET_PDEATHSIG = 1
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        import ctypes
+        _libc = ctypes.CDLL(None, use_errno=True)
+    except (ImportError, OSError):
+        _libc = None
+
+
+def _set_parent_death_signal() -> None:
+    """preexec_fn: 親プロセス終了時に SIGTERM を受け取るようにする。"""
+    _libc.prctl(_PR_SET_PDEATHSIG, signal.SIGTERM, 0, 0, 0)
+
+
+def _run_process_group(cmd: list[str], *, timeout: float) -> subprocess.CompletedProcess:
+    """新しいプロセスグループでコマンドを実行する。
+
+    タイムアウト・中断時は子だけでなくグループ全体（CLI が起動したデーモン等）を終了させる。
+    """
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+        preexec_fn=_set_parent_death_signal if _libc is not None else None,
+    ) as proc:
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except BaseException:
+            for sig in (signal.SIGTERM, signal.SIGKILL):
+                try:
+                    os.killpg(proc.pid, sig)
+                except ProcessLookupError:
+                    break
+                try:
+                    proc.wait(timeout=2)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+            raise
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
 def cmd_flash(args: argparse.Namespace) -> dict:
     """フラッシュ書き込み。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     binary = Path(args.binary)
     if not binary.exists():
         raise FileNotFoundError(f"バイナリが見つかりません: {binary}")
@@ -731,7 +1056,7 @@ def cmd_flash(args: argparse.Namespace) -> dict:
             if verify:
                 cmd.append("-v")
             cmd.append("-rst")
-            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=180)
+            proc = _run_process_group(cmd, timeout=180)
             if proc.returncode != 0:
                 err = (proc.stdout or "") + (proc.stderr or "")
                 raise RuntimeError(err.strip() or "STM32_Programmer_CLI flash failed")
@@ -813,7 +1138,7 @@ def cmd_flash(args: argparse.Namespace) -> dict:
 
 def cmd_read(args: argparse.Namespace) -> dict:
     """メモリ読み取り（halt → read → resume）。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
     size = int(args.size)
 
@@ -838,7 +1163,7 @@ def cmd_read(args: argparse.Namespace) -> dict:
 
 def cmd_read_symbol(args: argparse.Namespace) -> dict:
     """ELF シンボル → アドレス解決 → メモリ読み取り。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     elf = args.elf
     symbol = args.symbol
     size = int(args.size) if args.size else None
@@ -869,7 +1194,7 @@ def cmd_read_symbol(args: argparse.Namespace) -> dict:
 
 def cmd_read_symbols(args: argparse.Namespace) -> dict:
     """複数シンボルを単一セッションで読み取り。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     elf = args.elf
     symbols = list(args.symbols)
     if not symbols:
@@ -909,6 +1234,35 @@ def cmd_read_symbols(args: argparse.Namespace) -> dict:
         session.close()
 
 
+# この距離 (bytes) 以内のブロックは 1 回の転送にまとめて読む（ギャップが RAM 内の場合のみ）
+_COALESCE_GAP = 64
+
+
+def _gap_is_ram(target, start: int, end: int) -> bool:
+    """[start, end) が 1 つの RAM 領域に収まるか。
+
+    まとめ読みはブロック間のギャップも読むため、予約領域（フォールト）や
+    ペリフェラル（読み出しで状態が変わるレジスタ）に掛かる場合はまとめない。
+    """
+    try:
+        region = target.memory_map.get_region_for_address(start)
+        return region is not None and region.is_ram and region.contains_range(start, end=end - 1)
+    except Exception:
+        return False
+
+
+def _hex_words(data: bytes) -> list[str]:
+    """リトルエンディアンのワード列を ["0x%08X", ...] 形式の文字列リストにする。
+
+    ワード毎の % 書式ではなく、バイトスワップ後に bytes.hex() の C ループで一括変換する。
+    """
+    if not data:
+        return []
+    swapped = array.array("I", data)
+    swapped.byteswap()  # hex() はメモリ順に出力するため各ワードを MSB 先頭に並べ替える
+    return ("0x" + swapped.tobytes().hex(" ", 4).upper().replace(" ", " 0x")).split(" ")
+
+
 def _read_blocks(
     target,
     core,
@@ -916,66 +1270,199 @@ def _read_blocks(
     *,
     halt: bool = True,
 ) -> dict[str, dict[str, Any]]:
-    """複数ブロックをまとめて読み取る。halt=True の場合は halt→read→resume。"""
+    """複数ブロックをまとめて読み取る。halt=True の場合は halt→read→resume。
+
+    SWD はトランザクション毎の固定コストが大きいため、近接するブロック
+    （隣接・重複・RAM 内で _COALESCE_GAP 以内）は 1 回の read_memory_block32 にまとめ、
+    結果を各ブロックに切り分ける。まとめた読み出しが失敗した場合はブロック毎に読み直す。
+    """
+    runs: list[list[tuple[str, int, int]]] = []
+    run_end = -1
+    for key, addr, size in sorted(blocks, key=lambda b: b[1]):
+        end = addr + (size + 3) // 4 * 4
+        gap_end = addr & ~3
+        if runs and (gap_end <= run_end or (
+            gap_end <= run_end + _COALESCE_GAP and _gap_is_ram(target, run_end, gap_end)
+        )):
+            runs[-1].append((key, addr, size))
+            run_end = max(run_end, end)
+        else:
+            runs.append([(key, addr, size)])
+            run_end = end
+
     was_halted = target.get_state().name == "HALTED"
     did_halt = False
     if halt and not was_halted:
         core.halt()
         did_halt = True
 
-    try:
-        result: dict[str, dict[str, Any]] = {}
-        for key, addr, size in blocks:
+    def read_run(run: list[tuple[str, int, int]]) -> None:
+        start = run[0][1] & ~3
+        stop = max(addr + (size + 3) // 4 * 4 for _, addr, size in run)
+        n_words = (stop - start + 3) // 4
+        # 一括 pack（C ループ）
+        data = struct.pack(f"<{n_words}I", *target.read_memory_block32(start, n_words))
+        for key, addr, size in run:
             word_count = (size + 3) // 4
-            words = target.read_memory_block32(addr, word_count)
-            raw = b"".join(struct.pack("<I", w) for w in words)[:size]
+            chunk = data[addr - start : addr - start + word_count * 4]
             result[key] = {
-                "words": [f"0x{w:08X}" for w in words],
-                "hex": raw.hex(),
+                "words": _hex_words(chunk),
+                "hex": chunk[:size].hex(),
             }
+
+    try:
+        result: dict[str, dict[str, Any]] = {}
+        for run in runs:
+            if len(run) == 1:
+                read_run(run)
+                continue
+            try:
+                read_run(run)
+            except Exception:
+                # 個別の読み出しなら成功していたはずのブロックを失わないよう 1 つずつ読み直す
+                # （個別でも失敗するブロックはその例外をそのまま送出する）
+                for block in run:
+                    read_run([block])
         return result
     finally:
         if did_halt:
             core.resume()
 
 
-def _resolve_symbols(elf: str, names: list[str]) -> dict[str, tuple[int, int]]:
-    """ELF から複数シンボルを解決する。name substring に一致する最初のシンボルを採用。"""
-    r = subprocess.run(
-        ["arm-none-eabi-nm", "--demangle", "--print-size", elf],
-        capture_output=True, text=True, timeout=10,
-    )
-    if r.returncode != 0:
-        detail = (r.stderr or r.stdout or "").strip()
-        raise RuntimeError(f"arm-none-eabi-nm failed: {detail}")
+# ELF シンボルテーブルのプロセス内キャッシュ:
+#   (path, mtime_ns, size) → ([(symbol, addr, size)], 解決済みの名前 {name: (addr, size)})
+# MCP サーバのような常駐プロセスで同じ ELF への nm 再実行・同じ名前の再走査を避ける。
+_SYMTAB_CACHE: dict[
+    tuple[str, int, int],
+    tuple[list[tuple[str, int, int]], dict[str, tuple[int, int]]],
+] = {}
 
-    table: list[tuple[str, int, int]] = []
-    for line in r.stdout.splitlines():
-        parts = line.split()
-        if len(parts) < 3:
-            continue
-        symbol = parts[-1]
-        try:
-            addr = int(parts[0], 16)
-        except ValueError:
-            continue
+# nm --print-size の行: <addr> [<size>] <type> <name>（--defined-only なので addr は常にある）
+# name は demangle 後に空白を含むことがあるため行末まで取る。出力はバイト列のまま走査する
+_NM_LINE_RE = re.compile(rb"^([0-9A-Fa-f]{8,}) (?:([0-9A-Fa-f]{8,}) )?\S ([^\r\n]+)\r?$", re.M)
+
+# nm 出力を読むチャンクサイズ
+_NM_READ_CHUNK = 64 * 1024
+
+
+def _symtab_disk_cache_path(elf_path: str) -> Path:
+    # ELF パス毎に 1 ファイル（中身のキーで版を判定するので再ビルドで増えない）
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    digest = hashlib.sha1(elf_path.encode()).hexdigest()
+    return Path(base) / "pyocd_tool" / f"{digest}.pkl"
+
+
+def _load_symtab(elf: str) -> tuple[list[tuple[str, int, int]], dict[str, tuple[int, int]]]:
+    """arm-none-eabi-nm の出力を (symbol, addr, size) のリストにする（nm 順を保持）。
+
+    テーブルと共に、そのテーブルで解決済みの名前のメモ（_resolve_symbols が更新）を返す。
+    PYOCD_TOOL_CACHE=1 の場合はテーブルをディスクにも保存し、別プロセスからの
+    同じ版の ELF への呼び出しでは nm を実行しない。
+    """
+    st = os.stat(elf)
+    key = (os.path.abspath(elf), st.st_mtime_ns, st.st_size)
+    cached = _SYMTAB_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    table = None
+    disk_path = _symtab_disk_cache_path(key[0]) if DEFAULT_SYMTAB_DISK_CACHE else None
+    if disk_path is not None:
         try:
-            sym_size = int(parts[1], 16) if len(parts) >= 4 else 0
-        except ValueError:
-            sym_size = 0
-        table.append((symbol, addr, sym_size))
+            with open(disk_path, "rb") as f:
+                disk_key, disk_table = pickle.load(f)
+            if disk_key == key:
+                table = disk_table
+        except Exception:
+            pass
 
-    result: dict[str, tuple[int, int]] = {}
-    for name in names:
-        found: tuple[int, int] | None = None
-        for symbol, addr, sym_size in table:
-            if name in symbol:
-                found = (addr, sym_size)
+    if table is None:
+        table = _run_nm(elf)
+        if disk_path is not None:
+            try:
+                disk_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = disk_path.with_name(f"{disk_path.name}.{os.getpid()}.tmp")
+                with open(tmp, "wb") as f:
+                    pickle.dump((key, table), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, disk_path)
+            except OSError:
+                pass
+
+    # 古い版の ELF のエントリは捨てる（再ビルド毎に増えないように）
+    for k in [k for k in _SYMTAB_CACHE if k[0] == key[0]]:
+        del _SYMTAB_CACHE[k]
+    entry = _SYMTAB_CACHE[key] = (table, {})
+    return entry
+
+
+def _run_nm(elf: str) -> list[tuple[str, int, int]]:
+    """arm-none-eabi-nm を実行して (symbol, addr, size) のリストを返す。"""
+    # 大きな ELF では nm 出力が数 MB になるため、全体を str として溜めずに
+    # チャンク単位で読みながら完結した行だけをパースする（nm の出力と並行して進む）。
+    # stderr はパイプにすると stdout を読み終えるまで誰も読まず、警告が多いと nm が
+    # 書き込みでブロックするため一時ファイルに受ける
+    errfile = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(
+            ["arm-none-eabi-nm", "--defined-only", "--demangle", "--print-size", elf],
+            stdout=subprocess.PIPE, stderr=errfile,
+        )
+    except BaseException:
+        errfile.close()
+        raise
+    timer = threading.Timer(10, proc.kill)
+    timer.start()
+    table: list[tuple[str, int, int]] = []
+    try:
+        assert proc.stdout is not None
+        tail = b""
+        while True:
+            chunk = proc.stdout.read(_NM_READ_CHUNK)
+            buf = tail + chunk
+            # EOF までは最後の改行までを処理し、途中で切れた行は次のチャンクへ持ち越す
+            cut = buf.rfind(b"\n") + 1 if chunk else len(buf)
+            tail = buf[cut:]
+            table.extend(
+                (symbol.decode(errors="replace"), int(addr, 16), int(sym_size, 16) if sym_size else 0)
+                for addr, sym_size, symbol in _NM_LINE_RE.findall(buf, 0, cut)
+            )
+            if not chunk:
                 break
-        if found is None:
-            raise ValueError(f"シンボル '{name}' が {elf} に見つかりません")
-        result[name] = found
-    return result
+        returncode = proc.wait()
+        errfile.seek(0)
+        stderr = errfile.read()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        errfile.close()
+
+    if returncode != 0:
+        detail = stderr.decode(errors="replace").strip() or "timed out"
+        raise RuntimeError(f"arm-none-eabi-nm failed: {detail}")
+    return table
+
+
+def _resolve_symbols(elf: str, names: list[str]) -> dict[str, tuple[int, int]]:
+    """ELF から複数シンボルを解決する。name substring に一致する最初のシンボルを採用。"""
+    table, found = _load_symtab(elf)
+
+    # 未解決の名前についてテーブルを 1 回だけ走査し、それぞれの最初の一致を記録する
+    pending = [name for name in dict.fromkeys(names) if name not in found]
+    for symbol, addr, sym_size in table:
+        if not pending:
+            break
+        hits = [name for name in pending if name in symbol]
+        if hits:
+            for name in hits:
+                found[name] = (addr, sym_size)
+            pending = [name for name in pending if name not in found]
+
+    if pending:
+        raise ValueError(f"シンボル '{pending[0]}' が {elf} に見つかりません")
+    return {name: found[name] for name in names}
 
 
 def _resolve_symbol(elf: str, name: str) -> tuple[int, int]:
@@ -983,33 +1470,51 @@ def _resolve_symbol(elf: str, name: str) -> tuple[int, int]:
     return _resolve_symbols(elf, [name])[name]
 
 
-def cmd_regs(args: argparse.Namespace) -> dict:
-    """コアレジスタ読み取り。"""
-    uid, mcu = resolve_probe(args.mcu)
-    session = open_session(uid, mcu)
-    try:
-        target = session.target
-        core = target.cores[0]
-        was_halted = target.get_state().name == "HALTED"
+CORE_REG_NAMES = ["r0", "r1", "r2", "r3", "r4", "r5", "r6", "r7",
+                  "r8", "r9", "r10", "r11", "r12", "sp", "lr", "pc",
+                  "xpsr", "msp", "psp", "control", "faultmask",
+                  "basepri", "primask"]
 
-        if not was_halted:
-            core.halt()
 
-        reg_names = ["r0", "r1", "r2", "r3", "r4", "r5", "r6", "r7",
-                     "r8", "r9", "r10", "r11", "r12", "sp", "lr", "pc",
-                     "xpsr", "msp", "psp", "control", "faultmask",
-                     "basepri", "primask"]
+def _read_register_values(core, names: list[str]) -> dict[str, str]:
+    """halt 中のコアのレジスタを読む。読めないレジスタは省略。
+
+    read_core_registers_raw で 1 回の転送にまとめ、失敗した場合
+    （コアに無いレジスタを含む等）のみ 1 つずつ読み直す。
+    """
+    try:
+        values = core.read_core_registers_raw(names)
+    except Exception:
         regs = {}
-        for name in reg_names:
+        for name in names:
             try:
-                val = core.read_core_register(name)
-                regs[name] = f"0x{val:08X}"
+                regs[name] = f"0x{core.read_core_register(name):08X}"
             except Exception:
                 pass
+        return regs
+    return {name: f"0x{val:08X}" for name, val in zip(names, values)}
 
-        if not was_halted:
-            core.resume()
 
+def read_core_registers(target, core, names: list[str] = CORE_REG_NAMES) -> dict[str, str]:
+    """コアレジスタを読み取る（halt→read→resume）。読めないレジスタは省略。"""
+    was_halted = target.get_state().name == "HALTED"
+    if not was_halted:
+        core.halt()
+
+    regs = _read_register_values(core, names)
+
+    if not was_halted:
+        core.resume()
+    return regs
+
+
+def cmd_regs(args: argparse.Namespace) -> dict:
+    """コアレジスタ読み取り。"""
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
+    session = open_session(uid, mcu)
+    try:
+        target = session.target
+        regs = read_core_registers(target, target.cores[0])
         return {"uid": uid, "mcu": mcu, "registers": regs}
     finally:
         session.close()
@@ -1017,7 +1522,7 @@ def cmd_regs(args: argparse.Namespace) -> dict:
 
 def cmd_reset(args: argparse.Namespace) -> dict:
     """ターゲットリセット。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     session = open_session(uid, mcu, connect_mode="attach")
     try:
         session.target.reset()
@@ -1027,9 +1532,13 @@ def cmd_reset(args: argparse.Namespace) -> dict:
         session.close()
 
 
+# run-read で "words" を返す最大サイズ (bytes)。これを超える場合は "hex" のみ
+_RUN_READ_WORDS_MAX = 256
+
+
 def cmd_run_read(args: argparse.Namespace) -> dict:
     """reset → run → wait → halt → read。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
     size = int(args.size)
     run_ms = int(args.ms)
@@ -1045,28 +1554,54 @@ def cmd_run_read(args: argparse.Namespace) -> dict:
         core.halt()
 
         word_count = (size + 3) // 4
-        words = target.read_memory_block32(addr, word_count)
+        words = target.read_memory_block32(addr, word_count) if word_count else []
 
         core.resume()
 
-        raw = b""
-        for w in words:
-            raw += struct.pack("<I", w)
-        raw = raw[:size]
+        raw = struct.pack(f"<{len(words)}I", *words)
 
-        return {
+        result = {
             "uid": uid,
             "mcu": mcu,
             "address": f"0x{addr:08X}",
             "size": size,
             "run_ms": run_ms,
-            "words": [f"0x{w:08X}" for w in words],
-            "hex": raw.hex(),
         }
+        # 大きなダンプではワード毎の文字列リストを作らず hex のみ返す
+        if size <= _RUN_READ_WORDS_MAX:
+            result["words"] = _hex_words(raw)
+        result["hex"] = raw[:size].hex()
+        return result
     finally:
         session.close()
 
 
+# フォールトビット → (短縮名, 詳細説明)
+_CFSR_BITS: dict[int, tuple[str, str]] = {
+    0x0001:   ("IACCVIOL",    "Instruction access violation"),
+    0x0002:   ("DACCVIOL",    "Data access violation"),
+    0x0008:   ("MUNSTKERR",   "MemManage unstacking error"),
+    0x0010:   ("MSTKERR",     "MemManage stacking error"),
+    0x0020:   ("MLSPERR",     "MemManage FP lazy state"),
+    0x0100:   ("IBUSERR",     "Instruction bus error"),
+    0x0200:   ("PRECISERR",   "Precise data bus error"),
+    0x0400:   ("IMPRECISERR", "Imprecise data bus error"),
+    0x0800:   ("UNSTKERR",    "BusFault unstacking error"),
+    0x1000:   ("STKERR",      "BusFault stacking error"),
+    0x2000:   ("LSPERR",      "BusFault FP lazy state"),
+    1 << 16:  ("UNDEFINSTR",  "Undefined instruction"),
+    1 << 17:  ("INVSTATE",    "Invalid state - Thumb bit"),
+    1 << 18:  ("INVPC",       "Invalid PC load"),
+    1 << 19:  ("NOCP",        "No coprocessor"),
+    1 << 24:  ("UNALIGNED",   "Unaligned access"),
+    1 << 25:  ("DIVBYZERO",   "Division by zero"),
+}
+_HFSR_BITS: dict[int, tuple[str, str]] = {
+    1 << 1:   ("VECTTBL",     "Vector table read error"),
+    1 << 30:  ("FORCED",      "HardFault escalated from other fault"),
+}
+
+
 def _read_fault_info(target, core, *, verbose: bool = False) -> dict:
     """フォールトレジスタ + 例外スタックフレームを読み取る（セッション内で呼出）。
 
@@ -1090,66 +1625,64 @@ def _read_fault_info(target, core, *, verbose: bool = False) -> dict:
             "DFSR":  0xE000ED30,
             "AFSR":  0xE000ED3C,
         })
+    # ICSR..AFSR (0xE000ED04-0xE000ED3C) は連続しているので 1 回のブロック転送で読む。
+    # 失敗時（ARMv6-M 等）は従来どおり 1 レジスタずつ読む。
+    try:
+        block = target.read_memory_block32(0xE000ED04, 15)
+        read_scb = dict(zip(range(0xE000ED04, 0xE000ED40, 4), block)).__getitem__
+    except Exception:
+        read_scb = target.read32
+    scb_vals: dict[str, int] = {}
     for name, addr in scb_map.items():
         try:
-            val = target.read32(addr)
+            val = scb_vals[name] = read_scb(addr)
             fault_regs[name] = f"0x{val:08X}"
         except Exception:
             fault_regs[name] = "read_failed"
 
+    def scb(name: str) -> int:
+        # 上で読めた値を再利用し、読めなかったものだけ読み直す
+        val = scb_vals.get(name)
+        return read_scb(scb_map[name]) if val is None else val
+
     # CFSR/HFSR 解析
-    cfsr = target.read32(0xE000ED28)
-    hfsr = target.read32(0xE000ED2C)
-    icsr = target.read32(0xE000ED04)
+    cfsr = scb("CFSR")
+    hfsr = scb("HFSR")
+    icsr = scb("ICSR")
 
     active_exception = icsr & 0x1FF
     faults = []
 
-    # フォールトビット → (短縮名, 詳細説明)
-    cfsr_bits = [
-        (0x0001, "IACCVIOL",    "Instruction access violation"),
-        (0x0002, "DACCVIOL",    "Data access violation"),
-        (0x0008, "MUNSTKERR",   "MemManage unstacking error"),
-        (0x0010, "MSTKERR",     "MemManage stacking error"),
-        (0x0020, "MLSPERR",     "MemManage FP lazy state"),
-        (0x0100, "IBUSERR",     "Instruction bus error"),
-        (0x0200, "PRECISERR",   "Precise data bus error"),
-        (0x0400, "IMPRECISERR", "Imprecise data bus error"),
-        (0x0800, "UNSTKERR",    "BusFault unstacking error"),
-        (0x1000, "STKERR",      "BusFault stacking error"),
-        (0x2000, "LSPERR",      "BusFault FP lazy state"),
-        (1 << 16, "UNDEFINSTR", "Undefined instruction"),
-        (1 << 17, "INVSTATE",   "Invalid state - Thumb bit"),
-        (1 << 18, "INVPC",      "Invalid PC load"),
-        (1 << 19, "NOCP",       "No coprocessor"),
-        (1 << 24, "UNALIGNED",  "Unaligned access"),
-        (1 << 25, "DIVBYZERO",  "Division by zero"),
-    ]
-    hfsr_bits = [
-        (1 << 30, "FORCED",  "HardFault escalated from other fault"),
-        (1 << 1,  "VECTTBL", "Vector table read error"),
-    ]
-    for mask, name, desc in cfsr_bits:
-        if cfsr & mask:
-            faults.append(f"{name} ({desc})" if verbose else name)
-    for mask, name, desc in hfsr_bits:
-        if hfsr & mask:
-            faults.append(f"{name} ({desc})" if verbose else name)
+    for bits, table in ((cfsr, _CFSR_BITS), (hfsr, _HFSR_BITS)):
+        # 立っているビットだけを下位から取り出して引く（表の全走査をしない）
+        while bits:
+            low = bits & -bits
+            entry = table.get(low)
+            if entry:
+                faults.append(f"{entry[0]} ({entry[1]})" if verbose else entry[0])
+            bits ^= low
 
     # BFAR/MMFAR 有効チェック
     fault_addr = None
     if cfsr & 0x0080:  # BFARVALID
-        fault_addr = f"0x{target.read32(0xE000ED38):08X} (BFAR)"
+        fault_addr = f"0x{scb('BFAR'):08X} (BFAR)"
     elif cfsr & 0x0004:  # MMARVALID
-        fault_addr = f"0x{target.read32(0xE000ED34):08X} (MMFAR)"
+        fault_addr = f"0x{scb('MMFAR'):08X} (MMFAR)"
 
-    # 例外スタックフレーム
-    lr = core.read_core_register("lr")
+    # 例外スタックフレーム（lr と両 SP は 1 回の転送でまとめて読む）
+    try:
+        lr, msp, psp = core.read_core_registers_raw(["lr", "msp", "psp"])
+        stack_pointers = {"msp": msp, "psp": psp}
+    except Exception:
+        lr = core.read_core_register("lr")
+        stack_pointers = {}
     stack_frame = None
     if (lr & 0xFFFFFFF0) == 0xFFFFFFF0:
         use_psp = (lr & 0x4) != 0
         sp_name = "psp" if use_psp else "msp"
-        sp_val = core.read_core_register(sp_name)
+        sp_val = stack_pointers.get(sp_name)
+        if sp_val is None:
+            sp_val = core.read_core_register(sp_name)
         try:
             frame = target.read_memory_block32(sp_val, 8)
             stack_frame = {
@@ -1190,7 +1723,7 @@ def _read_fault_info(target, core, *, verbose: bool = False) -> dict:
 
 def cmd_step(args: argparse.Namespace) -> dict:
     """シングルステップ実行。N命令分実行してレジスタを返す。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     count = int(args.count) if args.count else 1
 
     session = open_session(uid, mcu)
@@ -1202,8 +1735,10 @@ def cmd_step(args: argparse.Namespace) -> dict:
             core.halt()
 
         steps = []
+        pc_after = core.read_core_register("pc")
         for i in range(count):
-            pc_before = core.read_core_register("pc")
+            # 前ステップの停止位置 = 次ステップの開始位置（PC 読み出しは 1 ステップ 1 回）
+            pc_before = pc_after
             core.step()
             pc_after = core.read_core_register("pc")
             steps.append({
@@ -1213,13 +1748,7 @@ def cmd_step(args: argparse.Namespace) -> dict:
             })
 
         # 最終状態のレジスタ
-        regs = {}
-        for name in ["pc", "sp", "lr", "r0", "r1", "r2", "r3", "xpsr"]:
-            try:
-                val = core.read_core_register(name)
-                regs[name] = f"0x{val:08X}"
-            except Exception:
-                pass
+        regs = _read_register_values(core, ["pc", "sp", "lr", "r0", "r1", "r2", "r3", "xpsr"])
 
         return {
             "uid": uid, "mcu": mcu,
@@ -1232,6 +1761,34 @@ def cmd_step(args: argparse.Namespace) -> dict:
         session.close()
 
 
+# Debug Halting Control and Status Register と S_HALT ビット
+_DHCSR = 0xE000EDF0
+_DHCSR_S_HALT = 1 << 17
+
+
+def _wait_halted(core, timeout_ms: int) -> tuple[bool, float]:
+    """コアが halt するまで待つ。Returns: (halt したか, 待機開始時刻)。
+
+    直後のヒットを逃さないよう最初は 2 ms 間隔でポーリングし、長い待機では
+    10 ms → 50 ms と間隔を広げてプローブへの状態問い合わせを減らす。
+    状態は is_halted() ではなく DHCSR.S_HALT を直接読んで判定する（1 ポーリング 1 リード、
+    リセット判定の再読み出しも無い）。pyOCD はレジスタキャッシュを resume/halt 呼び出しで
+    管理しており、DHCSR の直接読み出しはその状態に影響しない。
+    """
+    t0 = time.monotonic()
+    deadline = t0 + timeout_ms / 1000.0
+    polls = 0
+    while True:
+        if core.read32(_DHCSR) & _DHCSR_S_HALT:
+            return True, t0
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, t0
+        delay = 0.002 if polls < 10 else 0.01 if polls < 50 else 0.05
+        time.sleep(min(delay, remaining))
+        polls += 1
+
+
 def cmd_break_run(args: argparse.Namespace) -> dict:
     """ブレークポイント設定 → [前処理] → 実行 → ヒットまで待機 → レジスタ返却。
 
@@ -1244,7 +1801,7 @@ def cmd_break_run(args: argparse.Namespace) -> dict:
 
     全操作を単一セッション内で実行するため、ブレークポイントが有効。
     """
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
     timeout_ms = int(args.timeout) if args.timeout else 5000
     do_reset = getattr(args, "reset", False)
@@ -1278,13 +1835,7 @@ def cmd_break_run(args: argparse.Namespace) -> dict:
         core.resume()
 
         # ヒット待機
-        t0 = time.monotonic()
-        hit = False
-        while (time.monotonic() - t0) * 1000 < timeout_ms:
-            if core.is_halted():
-                hit = True
-                break
-            time.sleep(0.01)
+        hit, t0 = _wait_halted(core, timeout_ms)
 
         if not hit:
             core.halt()
@@ -1295,13 +1846,7 @@ def cmd_break_run(args: argparse.Namespace) -> dict:
         # レジスタ読み取り
         reg_names = ["pc", "sp", "lr", "r0", "r1", "r2", "r3",
                      "r12", "xpsr", "msp", "psp", "control"]
-        regs = {}
-        for name in reg_names:
-            try:
-                val = core.read_core_register(name)
-                regs[name] = f"0x{val:08X}"
-            except Exception:
-                pass
+        regs = _read_register_values(core, reg_names)
 
         halt_reason = "breakpoint" if hit else "timeout"
 
@@ -1330,31 +1875,19 @@ def cmd_wait_halt(args: argparse.Namespace) -> dict:
     bp-set → (セッション終了) → wait-halt ではブレークポイントが保持されない。
     ブレークポイント付き実行には `break` コマンド（単一セッション内で完結）を使用すること。
     """
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     timeout_ms = int(args.timeout) if args.timeout else 5000
 
     session = open_session(uid, mcu)
     try:
         core = session.target.cores[0]
 
-        t0 = time.monotonic()
-        hit = False
-        while (time.monotonic() - t0) * 1000 < timeout_ms:
-            if core.is_halted():
-                hit = True
-                break
-            time.sleep(0.01)
+        hit, t0 = _wait_halted(core, timeout_ms)
 
         if not hit:
             core.halt()
 
-        regs = {}
-        for name in ["pc", "sp", "lr", "r0", "r1", "r2", "r3", "xpsr"]:
-            try:
-                val = core.read_core_register(name)
-                regs[name] = f"0x{val:08X}"
-            except Exception:
-                pass
+        regs = _read_register_values(core, ["pc", "sp", "lr", "r0", "r1", "r2", "r3", "xpsr"])
 
         return {
             "uid": uid, "mcu": mcu,
@@ -1372,7 +1905,7 @@ def cmd_watch(args: argparse.Namespace) -> dict:
 
     メモリアドレスへの read/write を検知して停止する。
     """
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
     size = int(args.size) if args.size else 4
     watch_type = args.type or "write"
@@ -1404,13 +1937,7 @@ def cmd_watch(args: argparse.Namespace) -> dict:
         core.resume()
 
         # トリガー待機
-        t0 = time.monotonic()
-        hit = False
-        while (time.monotonic() - t0) * 1000 < timeout_ms:
-            if core.is_halted():
-                hit = True
-                break
-            time.sleep(0.01)
+        hit, t0 = _wait_halted(core, timeout_ms)
 
         if not hit:
             core.halt()
@@ -1418,20 +1945,24 @@ def cmd_watch(args: argparse.Namespace) -> dict:
         # ウォッチポイント除去
         core.remove_watchpoint(addr, size, wp_type)
 
+        # 対象メモリの現在値。ウォッチ範囲は通常数ワードなので遅延読み出しで先に積み、
+        # 続くレジスタの一括読み出しと同じ転送でプローブに送る。
+        # それより大きい範囲は別のブロック転送になるため --dump 指定時のみ読む
+        word_count = (size + 3) // 4
+        pending = None
+        if 0 < word_count <= 4:
+            pending = [target.read32(addr + 4 * i, now=False) for i in range(word_count)]
+
         # 停止地点のレジスタ
-        regs = {}
-        for name in ["pc", "sp", "lr", "r0", "r1", "r2", "r3"]:
-            try:
-                val = core.read_core_register(name)
-                regs[name] = f"0x{val:08X}"
-            except Exception:
-                pass
+        regs = _read_register_values(core, ["pc", "sp", "lr", "r0", "r1", "r2", "r3"])
 
-        # 対象メモリの現在値
-        word_count = (size + 3) // 4
-        words = target.read_memory_block32(addr, word_count)
+        words = None
+        if pending is not None:
+            words = [read() for read in pending]
+        elif word_count and getattr(args, "dump", False):
+            words = target.read_memory_block32(addr, word_count)
 
-        return {
+        result = {
             "uid": uid, "mcu": mcu,
             "watchpoint": f"0x{addr:08X}",
             "size": size,
@@ -1439,15 +1970,17 @@ def cmd_watch(args: argparse.Namespace) -> dict:
             "hit": hit,
             "elapsed_ms": round((time.monotonic() - t0) * 1000, 1),
             "registers": regs,
-            "memory": [f"0x{w:08X}" for w in words],
         }
+        if words is not None:
+            result["memory"] = [f"0x{w:08X}" for w in words]
+        return result
     finally:
         session.close()
 
 
 def cmd_write(args: argparse.Namespace) -> dict:
     """メモリ書き込み。テスト入力注入やデバッグ変数の設定に使用。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
 
     # 値をパース: "0x1234" or "1234" or "0x1234,0x5678"
@@ -1487,7 +2020,7 @@ def cmd_write(args: argparse.Namespace) -> dict:
 
 def cmd_write_reg(args: argparse.Namespace) -> dict:
     """レジスタ書き込み。PC 変更やスタック復旧に使用。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     reg = args.reg.lower()
     value = int(args.value, 0)
 
@@ -1516,7 +2049,7 @@ def cmd_write_reg(args: argparse.Namespace) -> dict:
 
 def cmd_halt(args: argparse.Namespace) -> dict:
     """ターゲットを停止。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     session = open_session(uid, mcu)
     try:
         target = session.target
@@ -1539,7 +2072,7 @@ def cmd_halt(args: argparse.Namespace) -> dict:
 
 def cmd_resume(args: argparse.Namespace) -> dict:
     """ターゲットの実行を再開。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     session = open_session(uid, mcu)
     try:
         target = session.target
@@ -1561,7 +2094,7 @@ def cmd_resume(args: argparse.Namespace) -> dict:
 
 def cmd_bp_set(args: argparse.Namespace) -> dict:
     """ブレークポイント設定（resume しない）。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
 
     session = open_session(uid, mcu, connect_mode="halt")
@@ -1582,7 +2115,7 @@ def cmd_bp_set(args: argparse.Namespace) -> dict:
 
 def cmd_bp_clear(args: argparse.Namespace) -> dict:
     """ブレークポイント解除。"""
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     addr = int(args.addr, 0)
 
     session = open_session(uid, mcu, connect_mode="halt")
@@ -1605,7 +2138,7 @@ def cmd_diagnose(args: argparse.Namespace) -> dict:
 
     クラッシュ原因の自動特定に使用。
     """
-    uid, mcu = resolve_probe(args.mcu)
+    uid, mcu = resolve_probe(args.mcu, getattr(args, "uid", None))
     session = open_session(uid, mcu)
     try:
         target = session.target
@@ -1618,13 +2151,7 @@ def cmd_diagnose(args: argparse.Namespace) -> dict:
         # コアレジスタ
         reg_names = ["pc", "sp", "lr", "r0", "r1", "r2", "r3",
                      "r12", "xpsr", "msp", "psp", "control"]
-        regs = {}
-        for name in reg_names:
-            try:
-                val = core.read_core_register(name)
-                regs[name] = f"0x{val:08X}"
-            except Exception:
-                pass
+        regs = _read_register_values(core, reg_names)
 
         # フォールト解析（verbose=True で追加レジスタ + 詳細説明）
         fault_info = _read_fault_info(target, core, verbose=True)
@@ -1640,76 +2167,188 @@ def cmd_diagnose(args: argparse.Namespace) -> dict:
         session.close()
 
 
-def cmd_cleanup(args: argparse.Namespace) -> dict:
-    """ゾンビプロセス終了。"""
-    killed = []
-    found = []
+# cleanup が終了させるデバッグ関連プロセス名（コマンドラインの部分一致）
+_CLEANUP_PROCESS_NAMES = ("pyocd", "openocd", "arm-none-eabi-gdb")
+
+
+def _find_processes(names: tuple[str, ...]) -> list[tuple[int, str]]:
+    """コマンドラインに names のいずれかを含むプロセスを (pid, "pid cmdline") で列挙する。
+
+    Linux では /proc を 1 回走査するだけで済ませ（名前毎の pgrep 起動を避ける）、
+    /proc が無い環境（macOS 等）では名前毎に pgrep -fl を使う。
+    """
+    procs: list[tuple[int, str]] = []
+    if os.path.isdir("/proc"):
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/cmdline", "rb") as f:
+                    raw = f.read()
+            except OSError:
+                continue
+            cmd = raw.rstrip(b"\0").replace(b"\0", b" ").decode(errors="ignore")
+            if cmd and any(name in cmd for name in names):
+                procs.append((int(entry.name), f"{entry.name} {cmd}"))
+        return procs
 
-    for proc_name in ["pyocd", "openocd", "arm-none-eabi-gdb"]:
+    seen: set[int] = set()
+    for name in names:
         try:
             r = subprocess.run(
-                ["pgrep", "-fl", proc_name],
+                ["pgrep", "-fl", name],
                 capture_output=True, text=True, timeout=5,
             )
-            for line in r.stdout.strip().splitlines():
-                if not line:
-                    continue
-                if "_server.py" in line or "mcp" in line or "pyocd_tool" in line:
-                    continue
-                pid = int(line.split()[0])
-                if pid == os.getpid():
-                    continue
-                found.append({"pid": pid, "cmd": line})
-
-                try:
-                    os.kill(pid, signal.SIGTERM)
-                    killed.append(pid)
-                except ProcessLookupError:
-                    pass
-                except PermissionError:
-                    pass
         except Exception:
+            continue
+        for line in r.stdout.strip().splitlines():
+            if not line:
+                continue
+            pid = int(line.split()[0])
+            if pid not in seen:
+                seen.add(pid)
+                procs.append((pid, line))
+    return procs
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def cmd_cleanup(args: argparse.Namespace) -> dict:
+    """ゾンビプロセス終了。"""
+    killed = []
+    found = []
+
+    for pid, line in _find_processes(_CLEANUP_PROCESS_NAMES):
+        if "_server.py" in line or "mcp" in line or "pyocd_tool" in line:
+            continue
+        if pid == os.getpid():
+            continue
+        found.append({"pid": pid, "cmd": line})
+
+        try:
+            os.kill(pid, signal.SIGTERM)
+            killed.append(pid)
+        except ProcessLookupError:
+            pass
+        except PermissionError:
             pass
 
-    if killed:
-        for i in range(6):
-            time.sleep(0.5)
-            remaining = []
-            for pid in killed:
-                try:
-                    os.kill(pid, 0)
-                    remaining.append(pid)
-                except ProcessLookupError:
-                    pass
-            if not remaining:
-                break
-            if i == 5:
-                for pid in remaining:
-                    try:
-                        os.kill(pid, signal.SIGKILL)
-                    except (ProcessLookupError, PermissionError):
-                        pass
+    # 終了待ち: 全て終了した時点で抜ける（短い間隔から倍々に伸ばす）。3 秒で残りを SIGKILL
+    remaining = killed
+    deadline = time.monotonic() + 3.0
+    delay = 0.02
+    while remaining:
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        remaining = [pid for pid in remaining if _process_alive(pid)]
+        if not remaining or time.monotonic() >= deadline:
+            break
+        delay = min(delay * 2, 0.2)
+    for pid in remaining:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
 
     return {"found": len(found), "killed": len(killed), "processes": found}
 
 
+# 保持セッションを先に閉じるコマンド: プローブを排他的に使う（IDCODE 検出 / 外部書き込みツール）
+# もの、および cleanup（デバッグ接続を全て解放する操作なので自分の保持分も閉じる）
+_SERVE_EXCLUSIVE_COMMANDS = {"list", "flash", "cleanup"}
+
+
+def _serve(parser: argparse.ArgumentParser, commands: dict) -> None:
+    """serve: stdin から 1 行 1 リクエストを読み、1 行 1 レスポンスを stdout に返す。
+
+    リクエストはサブコマンドの argv を JSON 配列で渡す（例: ["read", "0x20000000", "16"]）。
+    同じプローブへのセッションはコマンド間で保持し、接続/切断コストを 1 回に抑える。
+    コマンド実行エラー時は保持セッションを閉じ、次のコマンドで再接続する。
+    """
+    global _keep_sessions
+    _keep_sessions = True
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            command = None
+            try:
+                argv = json.loads(line)
+                if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+                    raise ValueError("リクエストは argv の JSON 配列で指定してください")
+                try:
+                    args = parser.parse_args(argv)
+                except SystemExit:
+                    raise ValueError(f"引数が不正です: {argv}") from None
+                command = args.command
+                if command == "serve":
+                    raise ValueError("serve は入れ子にできません")
+                if command in _SERVE_EXCLUSIVE_COMMANDS:
+                    close_kept_sessions()
+                response = commands[command](args)
+            except Exception as e:
+                if command is not None:
+                    close_kept_sessions()  # セッション異常の可能性 → 次のコマンドで再接続
+                response = {"error": str(e), "command": command}
+            print(json.dumps(response, ensure_ascii=False), flush=True)
+    finally:
+        _keep_sessions = False
+        close_kept_sessions()
+
+
 # ── CLI Entry Point ──
 
+# サブコマンド名 → 実装
+_COMMANDS = {
+    "list": cmd_list,
+    "status": cmd_status,
+    "flash": cmd_flash,
+    "read": cmd_read,
+    "read-symbol": cmd_read_symbol,
+    "read-symbols": cmd_read_symbols,
+    "regs": cmd_regs,
+    "reset": cmd_reset,
+    "run-read": cmd_run_read,
+    "step": cmd_step,
+    "break": cmd_break_run,
+    "watch": cmd_watch,
+    "write": cmd_write,
+    "write-reg": cmd_write_reg,
+    "wait-halt": cmd_wait_halt,
+    "diagnose": cmd_diagnose,
+    "halt": cmd_halt,
+    "resume": cmd_resume,
+    "cleanup": cmd_cleanup,
+}
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="pyOCD 統合デバッグツール（MCU 自動検出対応）",
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
+    parser.add_argument("--compact", action="store_true",
+                        help="JSON をインデント無しの 1 行で出力（スクリプト等からの呼び出し向け）")
     sub = parser.add_subparsers(dest="command", required=True)
 
     sub.add_parser("list", help="接続プローブ一覧（MCU 自動検出）")
 
     p = sub.add_parser("status", help="ターゲット状態")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     p = sub.add_parser("flash", help="フラッシュ書き込み")
     p.add_argument("binary", help="バイナリファイルパス")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
     p.add_argument("--backend", choices=["auto", "pyocd", "stm32cube"],
                    default=DEFAULT_FLASH_BACKEND,
                    help=f"書き込みバックエンド (default: {DEFAULT_FLASH_BACKEND})")
@@ -1734,34 +2373,41 @@ def main() -> None:
     p.add_argument("addr", help="開始アドレス (hex)")
     p.add_argument("size", help="バイト数")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     p = sub.add_parser("read-symbol", help="シンボル→メモリ読み取り")
     p.add_argument("elf", help="ELF ファイルパス")
     p.add_argument("symbol", help="シンボル名")
     p.add_argument("size", nargs="?", help="バイト数 (省略時はシンボルサイズ)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     p = sub.add_parser("read-symbols", help="複数シンボル→メモリ読み取り（単一セッション）")
     p.add_argument("elf", help="ELF ファイルパス")
     p.add_argument("symbols", nargs="+", help="シンボル名（複数可）")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     p = sub.add_parser("regs", help="レジスタ読み取り")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     p = sub.add_parser("reset", help="ターゲットリセット")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     p = sub.add_parser("run-read", help="reset→run→halt→read")
     p.add_argument("addr", help="開始アドレス (hex)")
     p.add_argument("size", help="バイト数")
     p.add_argument("ms", help="実行時間 (ms)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # step
     p = sub.add_parser("step", help="シングルステップ実行")
     p.add_argument("count", nargs="?", default="1", help="ステップ数 (デフォルト: 1)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # break (breakpoint + run + wait)
     p = sub.add_parser("break", help="ブレークポイント設定→実行→ヒット待機")
@@ -1771,21 +2417,25 @@ def main() -> None:
     p.add_argument("--set-pc", help="resume 前に PC を変更 (hex)")
     p.add_argument("--write", help="resume 前にメモリ書き込み (addr:val,addr:val,...)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # wait-halt
     p = sub.add_parser("wait-halt", help="halt 待機（BP ヒット待ち）")
     p.add_argument("--timeout", default="5000", help="タイムアウト (ms, デフォルト: 5000)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # bp-set (set breakpoint without resume)
     p = sub.add_parser("bp-set", help="ブレークポイント設定（resume しない）")
     p.add_argument("addr", help="ブレークポイントアドレス (hex)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # bp-clear (clear breakpoint)
     p = sub.add_parser("bp-clear", help="ブレークポイント解除")
     p.add_argument("addr", help="ブレークポイントアドレス (hex)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # watch (watchpoint + run + wait)
     p = sub.add_parser("watch", help="ウォッチポイント設定→実行→トリガー待機")
@@ -1794,64 +2444,63 @@ def main() -> None:
     p.add_argument("--type", choices=["read", "write", "access"], default="write",
                    help="トリガータイプ (デフォルト: write)")
     p.add_argument("--timeout", default="5000", help="タイムアウト (ms, デフォルト: 5000)")
+    p.add_argument("--dump", action="store_true",
+                   help="16 バイトを超える監視範囲もメモリ内容を返す（16 バイト以下は常に返す）")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # write (memory)
     p = sub.add_parser("write", help="メモリ書き込み")
     p.add_argument("addr", help="書き込みアドレス (hex)")
     p.add_argument("values", help="書き込み値 (カンマ区切り, 例: 0x1234,0x5678)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # write-reg
     p = sub.add_parser("write-reg", help="レジスタ書き込み")
     p.add_argument("reg", help="レジスタ名 (例: pc, sp, r0)")
     p.add_argument("value", help="書き込み値 (hex)")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # diagnose
     p = sub.add_parser("diagnose", help="フォールト診断（クラッシュ原因特定）")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # halt
     p = sub.add_parser("halt", help="ターゲット停止")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     # resume
     p = sub.add_parser("resume", help="実行再開")
     p.add_argument("--mcu", help="MCU ターゲット（省略時は自動検出）")
+    p.add_argument("--uid", help="プローブ UID（指定時はプローブ列挙を省略）")
 
     sub.add_parser("cleanup", help="ゾンビプロセス終了")
 
+    sub.add_parser("serve", help="stdin の JSON 行を順に実行（セッション再利用）")
+
     args = parser.parse_args()
 
-    commands = {
-        "list": cmd_list,
-        "status": cmd_status,
-        "flash": cmd_flash,
-        "read": cmd_read,
-        "read-symbol": cmd_read_symbol,
-        "read-symbols": cmd_read_symbols,
-        "regs": cmd_regs,
-        "reset": cmd_reset,
-        "run-read": cmd_run_read,
-        "step": cmd_step,
-        "break": cmd_break_run,
-        "watch": cmd_watch,
-        "write": cmd_write,
-        "write-reg": cmd_write_reg,
-        "wait-halt": cmd_wait_halt,
-        "diagnose": cmd_diagnose,
-        "halt": cmd_halt,
-        "resume": cmd_resume,
-        "cleanup": cmd_cleanup,
-    }
+    if args.command == "serve":
+        _serve(parser, _COMMANDS)
+        return
+
+    # --compact: 機械処理向けに改行・インデント無しの 1 行で出力
+    dump_opts: dict[str, Any] = {"ensure_ascii": False}
+    if args.compact:
+        dump_opts["separators"] = (",", ":")
+    else:
+        dump_opts["indent"] = 2
 
     try:
-        result = commands[args.command](args)
-        print(json.dumps(result, indent=2, ensure_ascii=False))
+        result = _COMMANDS[args.command](args)
+        print(json.dumps(result, **dump_opts))
     except Exception as e:
         error = {"error": str(e), "command": args.command}
-        print(json.dumps(error, indent=2, ensure_ascii=False), file=sys.stderr)
+        print(json.dumps(error, **dump_opts), file=sys.stderr)
         sys.exit(1)
 
 
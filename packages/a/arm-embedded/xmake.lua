@@ -113,6 +113,14 @@ package("arm-embedded")
         if os.isdir(scripts_src) then
             local scripts_dest = path.join(dest_root, "rules", "embedded", "scripts")
             sync_tree(scripts_src, scripts_dest)
+
+            -- Byte-compile so hooks importing lib_checksum skip source parsing.
+            -- Best-effort: Python is an optional dependency.
+            import("lib.detect.find_tool")
+            local python = find_tool("python3") or find_tool("python")
+            if python then
+                try { function () os.vrunv(python.program, {"-m", "compileall", "-q", scripts_dest}) end }
+            end
         end
     end)
     
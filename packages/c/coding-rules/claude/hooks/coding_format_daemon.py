@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Background worker for coding_post_edit_format (not a hook itself — no claude-hook metadata).
+
+The PostToolUse hook formats C++ files itself, synchronously, so the agent's next
+Read/Edit sees the final content. For xmake-repo/ edits it only appends the path to
+a queue file and makes sure this worker is running. The worker drains the queue,
+waits until edits have been quiet for a short window, then runs `xmake dev-sync`
+at most once per burst. It exits after a period with no edits.
+
+Queue protocol (all under queue_dir()):
+  queue        one path per line, appended under flock(queue.lock)
+  queue.lock   guards queue and the worker's exit decision
+  daemon.lock  held exclusively by the running worker for its lifetime
+  daemon.log   worker output (dev-sync results, errors)
+
+The hook imports this module on every edit for wants() and clang_format(), so only
+cheap modules are imported at the top; the rest is imported where it is used.
+
+Packaged by: coding-rules
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the hook runs dev-sync synchronously instead
+    fcntl = None
+
+# Edits arriving within this window are batched together
+DEBOUNCE_S = 0.2
+# Queue poll interval while idle
+POLL_S = 0.05
+# Exit after this long without edits (the hook restarts the worker on demand)
+IDLE_EXIT_S = 60.0
+
+CXX_SUFFIXES = (".cc", ".hh")
+
+
+def queue_dir() -> str:
+    """Per-user directory holding the queue, locks and log."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, "coding-format")
+    import tempfile
+
+    return os.path.join(tempfile.gettempdir(), f"coding-format-{os.getuid()}")
+
+
+def wants(file_path: str) -> bool:
+    """True if an edit to file_path needs any post-edit action."""
+    return file_path.endswith(CXX_SUFFIXES) or wants_dev_sync(file_path)
+
+
+def wants_dev_sync(file_path: str) -> bool:
+    """True if an edit to file_path needs `xmake dev-sync` (queued for the worker)."""
+    return "xmake-repo/" in file_path
+
+
+# The worker looks up xmake for every burst, so cache PATH lookups
+_which_cache: dict[str, str | None] = {}
+
+
+def _which(name: str) -> str | None:
+    if name not in _which_cache:
+        import shutil
+
+        _which_cache[name] = shutil.which(name)
+    return _which_cache[name]
+
+
+def clang_format(file_path: str) -> None:
+    """Run clang-format -i on file_path if it is a C++ source (called by the hook)."""
+    if not file_path.endswith(CXX_SUFFIXES) or not os.path.exists(file_path):
+        return
+    clang_format = _which("clang-format")
+    if clang_format is None:
+        return
+    import subprocess
+
+    try:
+        subprocess.run([clang_format, "-i", file_path], timeout=10, capture_output=True)
+    except (subprocess.TimeoutExpired, OSError):
+        pass
+
+
+def _devsync_cache_path() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "coding-rules", "devsync.json")
+
+
+# Not part of what dev-sync installs; skipped when hashing the xmake-repo/ tree
+_TREE_SKIP_DIRS = {".git", ".xmake", "build"}
+
+
+def _repo_root(path: str) -> str:
+    """The xmake-repo/ directory containing path."""
+    return path[:path.index("xmake-repo/") + len("xmake-repo")]
+
+
+def _tree_digest(root: str) -> str:
+    """Digest of every file (relative path + content) under root."""
+    import hashlib
+
+    h = hashlib.blake2b(digest_size=16)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in _TREE_SKIP_DIRS)
+        for name in sorted(filenames):
+            full = os.path.join(dirpath, name)
+            h.update(os.path.relpath(full, root).encode() + b"\0")
+            try:
+                with open(full, "rb") as f:
+                    h.update(hashlib.blake2b(f.read(), digest_size=16).digest())
+            except OSError:
+                h.update(b"unreadable")
+    return h.hexdigest()
+
+
+def _load_devsync_cache() -> dict[str, str]:
+    import json
+
+    try:
+        with open(_devsync_cache_path()) as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_devsync_cache(cache: dict[str, str]) -> None:
+    import json
+
+    path = _devsync_cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def dev_sync(paths: list[str]) -> None:
+    """Run xmake dev-sync once if any path is under xmake-repo/.
+
+    xmake-repo/ contains custom packages installed to ~/.xmake/.
+    Source edits are NOT picked up until `xmake dev-sync` is run.
+
+    Skipped when the whole xmake-repo/ tree has the same content as at the last
+    successful sync (no-op saves, edits reverted before the sync). dev-sync installs
+    the whole tree, so a per-file digest would go stale once other files change.
+    Tree digests are kept in ~/.cache/coding-rules/devsync.json; only the single
+    running worker writes it.
+    """
+    roots = {_repo_root(os.path.abspath(p)) for p in paths if wants_dev_sync(p)}
+    if not roots:
+        return
+    cache = _load_devsync_cache()
+    digests = {root: _tree_digest(root) for root in roots}
+    if all(cache.get(root) == d for root, d in digests.items()):
+        return
+    xmake = _which("xmake")
+    if xmake is None:
+        return
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            [xmake, "dev-sync"],
+            timeout=30,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode == 0:
+            _save_devsync_cache(digests)
+            print("xmake dev-sync completed (xmake-repo/ change detected)", file=sys.stderr)
+        else:
+            print(f"xmake dev-sync failed: {result.stderr.strip()}", file=sys.stderr)
+    except subprocess.TimeoutExpired:
+        print("xmake dev-sync timed out", file=sys.stderr)
+    except OSError:
+        pass
+
+
+def _drain(qdir: str) -> list[str]:
+    """Read and truncate the queue under its lock."""
+    with open(os.path.join(qdir, "queue.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(os.path.join(qdir, "queue"), "r+") as f:
+                data = f.read()
+                f.truncate(0)
+        except FileNotFoundError:
+            data = ""
+    return data.splitlines()
+
+
+def _release_if_idle(qdir: str, daemon_lock) -> bool:
+    """Give up the worker role if the queue is empty.
+
+    Done under the queue lock: a hook that appends afterwards sees daemon.lock
+    free and starts a new worker, so no queued path is left unprocessed.
+    """
+    with open(os.path.join(qdir, "queue.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.getsize(os.path.join(qdir, "queue")) > 0:
+                return False
+        except FileNotFoundError:
+            pass
+        daemon_lock.close()
+    return True
+
+
+def serve() -> None:
+    qdir = queue_dir()
+    os.makedirs(qdir, mode=0o700, exist_ok=True)
+    daemon_lock = open(os.path.join(qdir, "daemon.lock"), "a")
+    try:
+        fcntl.flock(daemon_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return  # another worker is running
+
+    queue = os.path.join(qdir, "queue")
+    last_work = time.monotonic()
+    while True:
+        try:
+            pending = os.path.getsize(queue) > 0
+        except FileNotFoundError:
+            pending = False
+
+        if not pending:
+            if time.monotonic() - last_work >= IDLE_EXIT_S and _release_if_idle(qdir, daemon_lock):
+                return
+            time.sleep(POLL_S)
+            continue
+
+        # Keep collecting until no new edit arrives for DEBOUNCE_S
+        paths = _drain(qdir)
+        while True:
+            time.sleep(DEBOUNCE_S)
+            more = _drain(qdir)
+            if not more:
+                break
+            paths += more
+
+        try:
+            dev_sync(list(dict.fromkeys(paths)))
+        except Exception as e:
+            print(f"coding_format_daemon: {e}", file=sys.stderr)
+        last_work = time.monotonic()
+
+
+if __name__ == "__main__":
+    serve()
@@ -2,12 +2,16 @@
 # claude-hook: event=PostToolUse matcher=Edit|Write
 """PostToolUse gateway: dispatch actions based on edited file path.
 
-Single entry point for all post-edit automation. Each action is a lightweight
-check — no heavy operations are performed synchronously.
+Single entry point for all post-edit automation.
 
 Actions:
-  1. clang-format: auto-format .cc/.hh files
-  2. dev-sync:     auto-run `xmake dev-sync` when xmake-repo/ is edited
+  1. clang-format: auto-format .cc/.hh files. Runs before the hook returns, so the
+                   agent's next Read/Edit sees the formatted content.
+  2. dev-sync:     auto-run `xmake dev-sync` when xmake-repo/ is edited. The hook only
+                   queues the path for the background worker (coding_format_daemon.py),
+                   which coalesces bursts of edits into one dev-sync.
+
+Without fcntl (Windows) dev-sync runs synchronously as before.
 
 Packaged by: coding-rules
 """
@@ -15,68 +19,64 @@ Packaged by: coding-rules
 from __future__ import annotations
 
 import json
-import shutil
-import subprocess
+import os
 import sys
-from pathlib import Path
 
-
-def _clang_format(file_path: str) -> None:
-    """Run clang-format -i on C++ source files."""
-    p = Path(file_path)
-    if p.suffix not in (".cc", ".hh"):
-        return
-    if not p.exists():
-        return
-    clang_format = shutil.which("clang-format")
-    if clang_format is None:
-        return
-    try:
-        subprocess.run([clang_format, "-i", str(p)], timeout=10, capture_output=True)
-    except (subprocess.TimeoutExpired, OSError):
-        pass
-
-
-def _dev_sync(file_path: str) -> None:
-    """Run xmake dev-sync when xmake-repo/ files are edited.
-
-    xmake-repo/ contains custom packages installed to ~/.xmake/.
-    Source edits are NOT picked up until `xmake dev-sync` is run.
-    """
-    if "xmake-repo/" not in file_path:
-        return
-    xmake = shutil.which("xmake")
-    if xmake is None:
-        return
-    try:
-        result = subprocess.run(
-            [xmake, "dev-sync"],
-            timeout=30,
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
-            print("xmake dev-sync completed (xmake-repo/ change detected)", file=sys.stderr)
-        else:
-            print(f"xmake dev-sync failed: {result.stderr.strip()}", file=sys.stderr)
-    except subprocess.TimeoutExpired:
-        print("xmake dev-sync timed out", file=sys.stderr)
-    except OSError:
-        pass
+import coding_format_daemon as worker
+
+
+def _enqueue(file_path: str) -> None:
+    """Append file_path to the worker queue and start the worker if it is not running."""
+    fcntl = worker.fcntl
+    qdir = worker.queue_dir()
+    os.makedirs(qdir, mode=0o700, exist_ok=True)
+    with open(os.path.join(qdir, "queue.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        fd = os.open(os.path.join(qdir, "queue"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, file_path.encode() + b"\n")
+        finally:
+            os.close(fd)
+
+        # The running worker holds daemon.lock; checked under the queue lock so a
+        # worker that is just exiting cannot miss this entry (see _release_if_idle)
+        with open(os.path.join(qdir, "daemon.lock"), "a") as probe:
+            try:
+                fcntl.flock(probe, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # worker running
+        import subprocess
+
+        with open(os.path.join(qdir, "daemon.log"), "a") as log:
+            subprocess.Popen(
+                [sys.executable, os.path.realpath(worker.__file__)],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                start_new_session=True,
+            )
 
 
 def main() -> None:
+    # Raw bytes: json.loads decodes the payload as UTF-8 regardless of the locale
+    # (the text-mode stdin would use e.g. cp932 on Windows and garble non-ASCII paths)
     try:
-        data = json.load(sys.stdin)
+        data = json.loads(sys.stdin.buffer.read())
     except (json.JSONDecodeError, EOFError, ValueError):
         return
 
     file_path = data.get("tool_input", {}).get("file_path", "")
-    if not file_path:
+    if not file_path or not worker.wants(file_path):
         return
 
-    _clang_format(file_path)
-    _dev_sync(file_path)
+    worker.clang_format(file_path)
+    if not worker.wants_dev_sync(file_path):
+        return
+    if worker.fcntl is None:
+        worker.dev_sync([file_path])
+        return
+    try:
+        _enqueue(file_path)
+    except OSError:
+        worker.dev_sync([file_path])
 
 
 if __name__ == "__main__":
@@ -13,32 +13,448 @@ Dependencies:
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
-import subprocess
+import os
+import shlex
+import shutil
 import sys
+import time
+from collections.abc import Awaitable, Callable
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 
 app = FastMCP("coding")
 
+# 応答 JSON は既定でコンパクト（読み手はエージェント）。CODING_MCP_PRETTY=1 で人間向けに字下げ
+_PRETTY = os.environ.get("CODING_MCP_PRETTY") == "1"
 
-def _run(args: list[str], timeout: int = 120) -> dict:
-    """Run subprocess with timeout."""
+
+def _dumps(obj: object) -> str:
+    if _PRETTY:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(",", ":"))
+
+
+# 実行ファイル名 → 絶対パス。常駐プロセスなので PATH 探索は見つかるまでの 1 回だけ
+# （見つからない間は後からのインストールを拾えるよう毎回探す）
+_exe_paths: dict[str, str] = {}
+
+
+def _which(name: str) -> str | None:
+    path = _exe_paths.get(name)
+    if path is None:
+        path = shutil.which(name)
+        if path is not None:
+            _exe_paths[name] = path
+    return path
+
+
+async def _run(args: list[str], timeout: int = 120) -> dict:
+    """Run subprocess with timeout.
+
+    Async so that a long scan does not block the event loop: other tool calls are
+    served while the subprocess runs.
+    """
+    exe = _which(args[0])
+    if exe is None:
+        return {"success": False, "stdout": "", "stderr": f"{args[0]}: command not found"}
     try:
-        r = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
-        return {
-            "success": r.returncode == 0,
-            "stdout": r.stdout.strip(),
-            "stderr": r.stderr.strip(),
-        }
-    except subprocess.TimeoutExpired:
-        return {"success": False, "stdout": "", "stderr": f"Timed out ({timeout}s)"}
+        proc = await asyncio.create_subprocess_exec(
+            exe, *args[1:], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
     except FileNotFoundError as e:
+        _exe_paths.pop(args[0], None)
         return {"success": False, "stdout": "", "stderr": str(e)}
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {"success": False, "stdout": "", "stderr": f"Timed out ({timeout}s)"}
+    except asyncio.CancelledError:
+        proc.kill()
+        raise
+    return {
+        "success": proc.returncode == 0,
+        "stdout": stdout.decode(errors="replace").strip(),
+        "stderr": stderr.decode(errors="replace").strip(),
+    }
+
+
+# lint 結果キャッシュ: (引数, ワークツリー状態) → (取得時刻, 応答 JSON)
+_LINT_CACHE_TTL = 30.0
+_lint_cache: dict[tuple, tuple[float, str]] = {}
+
+# ワークツリー状態に含める git 管理外の lint 入力（xmake lint の compdb 探索順）
+_LINT_UNTRACKED_INPUTS = ("build/compdb/compile_commands.json", "compile_commands.json")
+
+# cwd → git のワークツリールート（変わらないので 1 度だけ git rev-parse で求める）
+_git_toplevel: dict[str, str] = {}
+
+
+async def _worktree_state() -> str | None:
+    """HEAD と未コミット変更（パス + mtime/size）のダイジェスト。git 管理外なら None。
+
+    git status --porcelain=v2 --branch の 1 回の呼び出しで HEAD (branch.oid) と
+    変更ファイル一覧を得る（ワークツリールートは cwd 毎にキャッシュ）。変更済みファイルの再編集も拾えるよう各ファイルの stat を含める。
+    """
+    r = await _run(["git", "status", "--porcelain=v2", "--branch", "-z", "--untracked-files=all"],
+                   timeout=10)
+    if not r["success"]:
+        return None
+    cwd = os.getcwd()
+    root = _git_toplevel.get(cwd)
+    if root is None:
+        top = await _run(["git", "rev-parse", "--show-toplevel"], timeout=10)
+        if not top["success"]:
+            return None
+        root = _git_toplevel[cwd] = top["stdout"]
+    h = hashlib.blake2b(digest_size=16)
+    entries = iter(r["stdout"].split("\0"))
+    for entry in entries:
+        # 1/2/u/? 行のパスはフィールド数固定の後ろ（パスは空白を含み得る）
+        kind = entry[:1]
+        if kind == "1":
+            path = entry.split(" ", 8)[-1]
+        elif kind == "2":
+            path = entry.split(" ", 9)[-1]
+            next(entries, None)  # 移動元パス
+        elif kind == "u":
+            path = entry.split(" ", 10)[-1]
+        elif kind == "?":
+            path = entry[2:]
+        else:
+            h.update(entry.encode())  # "# branch.oid <sha>" などのヘッダ
+            continue
+        h.update(entry.encode())
+        try:
+            st = os.stat(os.path.join(root, path))
+            h.update(f"{st.st_mtime_ns}:{st.st_size}".encode())
+        except OSError:
+            pass
+    for path in _LINT_UNTRACKED_INPUTS:
+        try:
+            st = os.stat(path)
+            h.update(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+
+def _lint_response(result: dict) -> str | None:
+    """xmake lint --json の実行結果を応答 JSON にする。JSON でなければ None。"""
+    # JSON output from xmake lint --json: a single json.encode() object, passed through
+    # as is. Anything else (e.g. extra lines before it) goes through a full parse.
+    out = result["stdout"]
+    if not (result["success"] and out):
+        return None
+    if not _PRETTY and out[0] == "{" and out[-1] == "}" and "\n" not in out:
+        return out
+    try:
+        return _dumps(json.loads(out))
+    except json.JSONDecodeError:
+        return None
+
+
+def _compdb_entries() -> dict[str, dict]:
+    """xmake lint が全ファイル指定時に検査するソースの compdb エントリ（compdb 順、重複除去）。"""
+    for path in _LINT_UNTRACKED_INPUTS:
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+            break
+        except (OSError, ValueError):
+            continue
+    else:
+        return {}
+    sources: dict[str, dict] = {}
+    for e in entries:
+        if (isinstance(e, dict) and isinstance(e.get("file"), str)
+                and e["file"].endswith((".cc", ".cpp", ".c"))):
+            sources.setdefault(e["file"], e)
+    return sources
+
+
+# TU 単位の診断キャッシュ（ctcache 相当）:
+# ダイジェスト（lint 引数 + .clang-tidy + コンパイルコマンド + 前処理結果）→ 診断リスト
+def _tu_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "coding-rules", "ctcache")
+
+
+# 前処理 (-E) に置き換える際に落とすオプション（出力先・依存ファイル生成）
+_PP_DROP_WITH_ARG = ("-o", "-MF", "-MT", "-MQ")
+_PP_DROP = ("-c", "-MD", "-MMD", "-MP")
+
+
+def _preprocess_args(entry: dict) -> list[str] | None:
+    """compdb エントリのコンパイルコマンドを標準出力への前処理コマンドにする。"""
+    if isinstance(entry.get("arguments"), list):
+        args = entry["arguments"]
+    elif isinstance(entry.get("command"), str):
+        args = shlex.split(entry["command"])
+    else:
+        return None
+    if not args:
+        return None
+    out = [args[0]]
+    it = iter(args[1:])
+    for arg in it:
+        if arg in _PP_DROP_WITH_ARG:
+            next(it, None)
+        elif arg not in _PP_DROP:
+            out.append(arg)
+    # -C: NOLINT などのコメントも診断に効くため残す
+    out.extend(["-E", "-C"])
+    return out
+
+
+async def _tu_digest(entry: dict, salt: bytes, timeout: int = 60) -> str | None:
+    """TU の前処理結果のダイジェスト。前処理できなければ None（キャッシュしない）。
+
+    ヘッダの変更も前処理結果に現れるため、ソースの内容だけを見るより正確。
+    前処理結果は溜めずにストリームでハッシュする。
+    """
+    args = _preprocess_args(entry)
+    if args is None:
+        return None
+    h = hashlib.blake2b(salt, digest_size=16)
+    h.update(json.dumps(args).encode())
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            cwd=entry.get("directory") or None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+
+    async def consume() -> int:
+        while chunk := await proc.stdout.read(1 << 16):
+            h.update(chunk)
+        return await proc.wait()
+
+    try:
+        returncode = await asyncio.wait_for(consume(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return None
+    except asyncio.CancelledError:
+        proc.kill()
+        raise
+    return h.hexdigest() if returncode == 0 else None
+
+
+def _tu_cache_load(digest: str) -> list | None:
+    try:
+        with open(os.path.join(_tu_cache_dir(), f"{digest}.json")) as f:
+            diagnostics = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return diagnostics if isinstance(diagnostics, list) else None
+
+
+def _tu_cache_store(digest: str, diagnostics: list) -> None:
+    path = os.path.join(_tu_cache_dir(), f"{digest}.json")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(diagnostics, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+# clang-tidy の実体パス + --version 出力（TU キャッシュのキーに含める）。取得できたら以後再利用
+_clang_tidy_id: bytes | None = None
+
+
+async def _clang_tidy_identity() -> bytes | None:
+    """xmake lint が使う clang-tidy の識別子。見つからなければ None（TU キャッシュを使わない）。
+
+    clang-tidy を更新したら古い診断（「診断無し」を含む）を返さないよう、キーに含める。
+    """
+    global _clang_tidy_id  # noqa: PLW0603
+    if _clang_tidy_id is None:
+        path = _which("clang-tidy")
+        if path is None:
+            return None
+        r = await _run([path, "--version"], timeout=10)
+        if not r["success"]:
+            return None
+        _clang_tidy_id = os.path.realpath(path).encode() + b"\0" + r["stdout"].encode()
+    return _clang_tidy_id
+
+
+async def _sharded_lint(args: list[str], files: list[str], shards: int, timeout: int,
+                        on_chunk: Callable[[int, dict], Awaitable[None]] | None = None,
+                        ) -> tuple[dict | None, dict]:
+    """ファイル一覧を shards 個の連続区間に分け、xmake lint を並列に実行して結果を結合する。
+
+    xmake lint はファイルを 1 つずつ順に clang-tidy に掛けるため、区間毎に別プロセスで
+    走らせて並列化する。on_chunk は区間が終わる度に (ファイル数, 区間の結果) で呼ばれる。
+    Returns: (結合した結果, 失敗時の _run 結果)。
+    """
+    size = -(-len(files) // shards)
+    chunks = [files[i:i + size] for i in range(0, len(files), size)]
+
+    async def lint_chunk(chunk: list[str]) -> tuple[dict, dict | None]:
+        result = await _run([*args, "--input", ",".join(chunk)], timeout=timeout)
+        try:
+            if not result["success"]:
+                raise ValueError
+            part = json.loads(result["stdout"])
+            if not isinstance(part, dict):
+                raise ValueError
+        except ValueError:
+            return result, None
+        if on_chunk is not None:
+            await on_chunk(len(chunk), part)
+        return result, part
+
+    results = await asyncio.gather(*(lint_chunk(chunk) for chunk in chunks))
+    merged: dict = {"success": True, "total_warnings": 0, "total_errors": 0, "files": []}
+    for result, part in results:
+        if part is None:
+            return None, result
+        merged["success"] = merged["success"] and bool(part.get("success", True))
+        merged["total_warnings"] += part.get("total_warnings", 0)
+        merged["total_errors"] += part.get("total_errors", 0)
+        if isinstance(part.get("files"), list):
+            merged["files"].extend(part["files"])
+    return merged, results[0][0]
+
+
+# 進捗通知 (progress, total, message)。FastMCP の Context.report_progress
+_Progress = Callable[[float, float | None, str | None], Awaitable[None]]
+
+
+async def _lint_sources(args: list[str], sources: dict[str, dict], shards: int, timeout: int,
+                        *, use_cache: bool, progress: _Progress | None = None,
+                        ) -> tuple[dict | None, dict]:
+    """compdb エントリ sources を検査する。use_cache なら TU キャッシュに無いものだけ xmake に渡す。
+
+    xmake lint は診断の無いファイルを結果に含めないため、渡したファイルで結果に無いものは
+    「診断無し」としてキャッシュする。progress には区間が終わる度に検査済みファイル数と
+    その時点の警告・エラー数を通知する。Returns: (結果, 失敗時の _run 結果)。
+    """
+    files = list(sources)
+    digests: list[str | None] = [None] * len(files)
+    cached: dict[str, list] = {}
+    if use_cache and (tidy_id := await _clang_tidy_identity()) is not None:
+        try:
+            with open(".clang-tidy", "rb") as f:
+                tidy_config = f.read()
+        except OSError:
+            tidy_config = b""
+        salt = b"\0".join((tidy_id, json.dumps(args).encode(), tidy_config))
+        sem = asyncio.Semaphore(max(shards, 1))
+
+        async def digest(entry: dict) -> str | None:
+            async with sem:
+                return await _tu_digest(entry, salt)
+
+        digests = await asyncio.gather(*(digest(sources[f]) for f in files))
+        for file, d in zip(files, digests):
+            if d is not None and (diagnostics := _tu_cache_load(d)) is not None:
+                cached[file] = diagnostics
+
+    misses = [f for f in files if f not in cached]
+    counts = {"done": len(cached), "warning": 0, "error": 0}
+    for diagnostics in cached.values():
+        for d in diagnostics:
+            severity = d.get("severity") if isinstance(d, dict) else None
+            if severity in counts:
+                counts[severity] += 1
+
+    async def on_chunk(n: int, part: dict) -> None:
+        counts["done"] += n
+        counts["warning"] += part.get("total_warnings", 0)
+        counts["error"] += part.get("total_errors", 0)
+        await progress(counts["done"], len(files),
+                       f"{counts['done']}/{len(files)} files: "
+                       f"{counts['warning']} warning(s), {counts['error']} error(s)")
+
+    fresh: dict[str, list] = {}
+    extra: list = []
+    failure: dict = {}
+    if misses:
+        part, failure = await _sharded_lint(args, misses, min(shards, len(misses)), timeout,
+                                            on_chunk if progress is not None else None)
+        if part is None:
+            return None, failure
+        rel = {os.path.relpath(f): f for f in misses}
+        for r in part["files"]:
+            file = rel.get(r.get("file")) if isinstance(r, dict) else None
+            if file is None or not isinstance(r.get("diagnostics"), list):
+                extra.append(r)
+            else:
+                fresh[file] = r["diagnostics"]
+        if not extra:
+            for file, d in zip(files, digests):
+                if d is not None and file not in cached:
+                    _tu_cache_store(d, fresh.setdefault(file, []))
+
+    merged: dict = {"success": True, "total_warnings": 0, "total_errors": 0, "files": []}
+    for file in files:
+        diagnostics = cached[file] if file in cached else fresh.get(file)
+        if diagnostics:
+            merged["files"].append({"file": os.path.relpath(file), "diagnostics": diagnostics})
+    merged["files"].extend(extra)
+    for r in merged["files"]:
+        for d in r.get("diagnostics", ()):
+            severity = d.get("severity") if isinstance(d, dict) else None
+            if severity == "warning":
+                merged["total_warnings"] += 1
+            elif severity == "error":
+                merged["total_errors"] += 1
+    merged["success"] = merged["total_errors"] == 0
+    return merged, failure
+
+
+async def _cached_lint(args: list[str], timeout: int, *, use_cache: bool, shards: int = 1,
+                       sources: dict[str, dict] | None = None,
+                       progress: _Progress | None = None) -> str:
+    """xmake lint --json を実行して応答 JSON を返す。
+
+    同じ引数・同じワークツリー状態での TTL 内の再呼び出しは前回の結果を返す。
+    sources (compdb エントリ) を渡すとそれらを shards 並列で検査し、use_cache なら
+    TU キャッシュも使う（args はファイル指定無し）。progress は sources 検査時の進捗通知。
+    """
+    key = None
+    if use_cache:
+        state = await _worktree_state()
+        if state is not None:
+            key = (tuple(args), tuple(sources or ()), state)
+            hit = _lint_cache.get(key)
+            if hit is not None and time.monotonic() - hit[0] < _LINT_CACHE_TTL:
+                return hit[1]
+
+    if sources:
+        merged, failure = await _lint_sources(args, sources, shards, timeout,
+                                              use_cache=use_cache, progress=progress)
+        response = None if merged is None else _dumps(merged)
+    else:
+        failure = await _run(args, timeout=timeout)
+        response = _lint_response(failure)
+    if response is None:
+        return _dumps(failure)
+
+    if key is not None:
+        now = time.monotonic()
+        for k in [k for k, (ts, _) in _lint_cache.items() if now - ts >= _LINT_CACHE_TTL]:
+            del _lint_cache[k]
+        _lint_cache[key] = (now, response)
+    return response
 
 
 @app.tool()
-def lint_files(files: str = "", target: str = "", checks: str = "", changed: bool = False) -> str:
+async def lint_files(files: str = "", target: str = "", checks: str = "", changed: bool = False) -> str:
     """clang-tidy を compile_commands.json ベースで実行して結果を返す。
 
     Args:
@@ -48,40 +464,57 @@ def lint_files(files: str = "", target: str = "", checks: str = "", changed: boo
         changed: True なら git diff のファイルのみ
     """
     args = ["xmake", "lint", "--json"]
+    if checks:
+        args.extend(["--checks", checks])
+    if files and not (target or changed):
+        # 全ファイルが compdb にあれば TU キャッシュ経由（全てヒットなら xmake を起動しない）
+        entries = {os.path.abspath(os.path.join(e.get("directory") or "", f)): (f, e)
+                   for f, e in _compdb_entries().items()}
+        wanted = [entries.get(os.path.abspath(f.strip())) for f in files.split(",") if f.strip()]
+        if wanted and all(wanted):
+            sources = dict(wanted)
+            return await _cached_lint(args, 120, use_cache=True,
+                                      shards=min(len(sources), os.cpu_count() or 1), sources=sources)
     if files:
-        args.extend(["--files", files])
+        args.extend(["--input", files])
     if target:
         args.extend(["--target", target])
-    if checks:
-        args.extend(["--checks", checks])
     if changed:
         args.append("--changed")
-    result = _run(args, timeout=120)
-
-    # JSON output from xmake lint --json
-    if result["success"] and result["stdout"]:
-        try:
-            parsed = json.loads(result["stdout"])
-            return json.dumps(parsed, indent=2)
-        except json.JSONDecodeError:
-            pass
-    return json.dumps(result, indent=2)
+    return await _cached_lint(args, 120, use_cache=not changed)
 
 
 @app.tool()
-def format_file(file: str) -> str:
+async def format_file(file: str) -> str:
     """指定ファイルを clang-format で整形する。
 
+    xmake format と同じくプロジェクトルートの .clang-format で clang-format を直接実行する
+    （xmake を経由しない）。clang-format か .clang-format が無ければ xmake format に任せる。
+
     Args:
         file: フォーマットするファイルパス
     """
-    args = ["xmake", "format", "--files", file]
-    result = _run(args, timeout=30)
-    return json.dumps({"success": result["success"], "output": result["stdout"]}, indent=2)
+    config = os.path.abspath(".clang-format")
+    if _which("clang-format") is None or not os.path.isfile(config):
+        result = await _run(["xmake", "format", "--input", file], timeout=30)
+        return _dumps({"success": result["success"], "output": result["stdout"]})
+
+    if not os.path.isfile(file):
+        return _dumps({"success": True, "output": "No files to format."})
+    # clang-format -i は変更が無ければ書き込まないので mtime で整形の有無を判定する
+    before = os.stat(file).st_mtime_ns
+    result = await _run(["clang-format", "-i", f"--style=file:{config}", file], timeout=30)
+    if not result["success"]:
+        return _dumps({"success": False, "output": result["stderr"]})
+    if os.stat(file).st_mtime_ns != before:
+        output = "Formatted 1 file(s)."
+    else:
+        output = "All 1 files are already properly formatted."
+    return _dumps({"success": True, "output": output})
 
 
 @app.tool()
-def format_check(files: str = "") -> str:
+async def format_check(files: str = "") -> str:
     """clang-format の差分を確認する（修正はしない）。
 
     Args:
@@ -89,31 +522,33 @@ def format_check(files: str = "") -> str:
     """
     args = ["xmake", "format", "--dry-run"]
     if files:
-        args.extend(["--files", files])
-    result = _run(args, timeout=60)
-    return json.dumps({"success": result["success"], "output": result["stdout"]}, indent=2)
+        args.extend(["--input", files])
+    result = await _run(args, timeout=60)
+    return _dumps({"success": result["success"], "output": result["stdout"]})
 
 
 @app.tool()
-def run_scan_all(scope: str = "all", workers: int = 8) -> str:
+async def run_scan_all(scope: str = "all", workers: int = 8, cache: bool = True,
+                       ctx: Context | None = None) -> str:
     """プロジェクト全体の clang-tidy スキャンを実行する。
 
+    全ファイル検査中は、並列ワーカーが終わる度に検査済みファイル数と警告・エラー数を
+    進捗通知 (notifications/progress) で送る。結果は最後にまとめて返す。
+
     Args:
         scope: スキャン対象 ("all", "changed")
         workers: 並列ワーカー数 (デフォルト: 8)
+        cache: False なら結果キャッシュ・TU キャッシュを使わず全ファイルを再検査する
     """
     args = ["xmake", "lint", "--json"]
     if scope == "changed":
         args.append("--changed")
-    result = _run(args, timeout=300)  # longer timeout for full scan
-
-    if result["success"] and result["stdout"]:
-        try:
-            parsed = json.loads(result["stdout"])
-            return json.dumps(parsed, indent=2)
-        except json.JSONDecodeError:
-            pass
-    return json.dumps(result, indent=2)
+        # changed は対象が少なく xmake 側の git 差分抽出に任せる
+        return await _cached_lint(args, 300, use_cache=False)
+    # longer timeout for full scan
+    return await _cached_lint(args, 300, use_cache=cache, shards=min(workers, os.cpu_count() or 1),
+                              sources=_compdb_entries(),
+                              progress=ctx.report_progress if ctx is not None else None)
 
 
 if __name__ == "__main__":